@@ -26,6 +26,16 @@ def run_test(test_name: str) -> None:
     result = hermes_test_api.run_test(test_name, _callback_handler, verbose)
     print(f'Test {test_name} result: {result}')
 
+def run_load(seconds: float, direction: str, rate: float) -> None:
+    """Repeat board transfers for a set duration and print the report."""
+    report = hermes_test_api.run_load(direction, seconds, rate, _callback_handler)
+    print(report)
+
+def run_replay(filename: str, speed: float) -> None:
+    """Replay a captured session and print the report."""
+    report = hermes_test_api.run_replay(filename, speed or None)
+    print(report)
+
 # pylint: disable=unused-argument
 def _callback_handler(text: str, from_func: str, evt: CbEvt, **kwargs):
     """Default callback handler."""
@@ -38,13 +48,29 @@ if __name__ == '__main__':
     parser.add_argument("-l", "--list", action='store_true', help="list all available test cases")
     parser.add_argument("-v", "--verbose", action='store_true',
                         help="increase output verbosity, recommended if Hermes Testdriver is used")
+    parser.add_argument("--load", type=float, metavar="SECONDS",
+                        help="repeat complete board transfers for SECONDS and report the cycle rate")
+    parser.add_argument("--direction", choices=['to_sut', 'from_sut'], default='from_sut',
+                        help="board transport direction of the load run, default from_sut")
+    parser.add_argument("--rate", type=float, metavar="CYCLES",
+                        help="target board transfers per second of the load run, default as fast as possible")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay the first connection of a capture file against the system under test")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed factor, 0 for as fast as possible, default 1")
+    parser.add_argument("--queued-log", action='store_true',
+                        help="write the log file on a background thread, recommended for load runs")
     parser.add_argument("test", nargs='?', help="name of test case")
     cmd_args = parser.parse_args()
     testname = cmd_args.test
     verbose = cmd_args.verbose
 
-    hermes_test_api.setup_default_logging(LOG_FILE)
-    if testname is None:
+    hermes_test_api.setup_default_logging(LOG_FILE, queued=cmd_args.queued_log)
+    if cmd_args.replay is not None:
+        run_replay(cmd_args.replay, cmd_args.speed)
+    elif cmd_args.load is not None:
+        run_load(cmd_args.load, cmd_args.direction, cmd_args.rate)
+    elif testname is None:
         show_list()
     elif testname == 'all':
         run_all()
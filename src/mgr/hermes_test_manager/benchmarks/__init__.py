@@ -0,0 +1 @@
+"""Micro-benchmarks for the IPC-Hermes-9852 implementation."""
@@ -0,0 +1,58 @@
+"""Run the micro-benchmark suite. From the hermes_test_manager directory:
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --baseline results.json --threshold 0.1
+
+With a baseline the exit status is 1 if a benchmark is slower than the
+baseline by more than the threshold.
+"""
+
+import sys
+import argparse
+
+from benchmarks import runner
+from benchmarks import bench_messages, bench_framing, bench_state_machine  # pylint: disable=unused-import
+
+
+def main() -> int:
+    """Run the selected benchmarks, save and compare the results."""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Micro-benchmarks of the IPC-Hermes-9852 implementation")
+    parser.add_argument("-k", metavar="PATTERN", help="run benchmarks whose name matches the regular expression")
+    parser.add_argument("-l", "--list", action='store_true', help="list the benchmarks")
+    parser.add_argument("--repeat", type=int, default=runner.REPEAT,
+                        help=f"repeats per benchmark, the best is kept, default {runner.REPEAT}")
+    parser.add_argument("--output", metavar="FILE", help="save the results as JSON")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with results saved before")
+    parser.add_argument("--threshold", type=float, default=runner.THRESHOLD,
+                        help=f"relative slowdown counted as regression, default {runner.THRESHOLD}")
+    args = parser.parse_args()
+
+    benchmarks = runner.select(args.k)
+    if args.list:
+        for bench in benchmarks:
+            print(bench.name)
+        return 0
+
+    baseline = runner.load(args.baseline) if args.baseline else None
+    results = runner.run(benchmarks, args.repeat,
+                         lambda name, ns: print(f"{name:<40} {ns:>12.1f} ns/op", flush=True))
+    if args.output:
+        runner.save(results, args.output)
+    if baseline is None:
+        return 0
+
+    comparisons = runner.compare(results, baseline)
+    print(f"\n{'benchmark':<40} {'baseline':>12} {'now':>12} {'change':>8}")
+    for comparison in comparisons:
+        print(f"{comparison.name:<40} {comparison.baseline_ns:>12.1f} {comparison.ns:>12.1f} "
+              f"{comparison.change:>+8.1%}")
+    regressions = runner.regressions(comparisons, args.threshold)
+    for regression in regressions:
+        print(f"Regression: {regression.name} {regression.change:+.1%} "
+              f"exceeds {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
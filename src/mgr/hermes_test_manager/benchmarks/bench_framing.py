@@ -0,0 +1,146 @@
+"""Micro-benchmark of splitting the received byte stream into frames.
+
+Compares the MessageFramer with the previous approach of appending each
+packet to a bytes object and searching for the end tag from offset zero.
+Run from the hermes_test_manager directory:
+
+    python -m benchmarks.bench_framing
+
+The framer and the complete receive path of a connection are also part
+of the benchmark suite, see python -m benchmarks.
+"""
+
+import time
+
+from ipc_hermes.framing import MessageFramer, ENDTAG, BUFFERSIZE
+from ipc_hermes.messages import Message, MAX_MESSAGE_SIZE
+from ipc_hermes.connections import DownstreamConnection
+
+from benchmarks.runner import benchmark
+
+MEGABYTE = 1024 * 1024
+
+
+class _PacketSource:
+    """Socket stand-in returning a prepared list of packets."""
+    def __init__(self, packets):
+        self._packets = packets
+        self._index = 0
+
+    def recv(self, _):
+        """Next packet as bytes, like socket.recv."""
+        packet = self._packets[self._index]
+        self._index += 1
+        return packet
+
+    def recv_into(self, buffer):
+        """Copy the next packet into the buffer, like socket.recv_into."""
+        packet = self._packets[self._index]
+        self._index += 1
+        buffer[:len(packet)] = packet
+        return len(packet)
+
+
+def make_packets(message_size: int, total_bytes: int) -> list:
+    """Split a stream of messages of about message_size bytes into socket sized packets."""
+    msg_bytes = Message.BoardAvailable('00000000-0000-0000-0000-000000000000', 'Benchmark').to_bytes()
+    padding = max(0, message_size - len(msg_bytes))
+    splitat = msg_bytes.find(b'BoardIdCreatedBy=') + len(b'BoardIdCreatedBy="')
+    msg_bytes = msg_bytes[:splitat] + padding * b'x' + msg_bytes[splitat:]
+    stream = msg_bytes * max(1, total_bytes // len(msg_bytes))
+    return [stream[i:i + BUFFERSIZE] for i in range(0, len(stream), BUFFERSIZE)]
+
+
+def legacy_split(packets: list) -> int:
+    """Bytes concatenation and rescanning from offset zero, as done before MessageFramer."""
+    sock = _PacketSource(packets)
+    pending = b''
+    frames = 0
+    for _ in packets:
+        pending += sock.recv(BUFFERSIZE)
+        while True:
+            index = pending.find(ENDTAG)
+            if index == -1:
+                break
+            splitat = index + len(ENDTAG)
+            _, pending = pending[:splitat], pending[splitat:]
+            frames += 1
+    return frames
+
+
+def framer_split(packets: list) -> int:
+    """Receive into the reusable buffer of a MessageFramer."""
+    sock = _PacketSource(packets)
+    framer = MessageFramer()
+    frames = 0
+    for _ in packets:
+        framer.receive(sock)
+        for frame in framer.frames():
+            frame.release()
+            frames += 1
+    return frames
+
+
+def connection_receive(connection: DownstreamConnection, packets: list) -> int:
+    """Receive, frame, parse and put into the mailbox as a connected socket would."""
+    sock = _PacketSource(packets)
+    for _ in packets:
+        connection._handle_received_message(sock)  # pylint: disable=protected-access
+    received = len(connection.mailbox)
+    connection.mailbox.clear()
+    return received
+
+
+SUITE_MESSAGES = 1000
+SUITE_MESSAGE_SIZE = 300
+
+
+@benchmark('framing.framer', ops=SUITE_MESSAGES)
+def suite_framer():
+    """Frame 300-byte messages received in socket sized packets."""
+    packets = make_packets(SUITE_MESSAGE_SIZE, SUITE_MESSAGES * SUITE_MESSAGE_SIZE)
+    return lambda: framer_split(packets)
+
+
+@benchmark('receive.handle_received_message', ops=SUITE_MESSAGES)
+def suite_receive():
+    """Receive path of a connection: frame, parse and put into the mailbox."""
+    packets = make_packets(SUITE_MESSAGE_SIZE, SUITE_MESSAGES * SUITE_MESSAGE_SIZE)
+    connection = DownstreamConnection()
+    return lambda: connection_receive(connection, packets)
+
+
+@benchmark('receive.streaming', ops=SUITE_MESSAGES)
+def suite_streaming_receive():
+    """Receive path of a connection parsing while bytes arrive."""
+    packets = make_packets(SUITE_MESSAGE_SIZE, SUITE_MESSAGES * SUITE_MESSAGE_SIZE)
+    connection = DownstreamConnection()
+    connection.streaming_receive = True
+    return lambda: connection_receive(connection, packets)
+
+
+def measure(func, packets: list, repeat: int = 5) -> float:
+    """Return the best time in seconds per megabyte received."""
+    total_bytes = sum(len(packet) for packet in packets)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(packets)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * MEGABYTE / total_bytes
+
+
+def main():
+    """Print the cost per megabyte for small and maximum size messages."""
+    print(f"{'message size':>14} {'legacy ms/MB':>14} {'framer ms/MB':>14}")
+    for message_size in (300, 4 * BUFFERSIZE, MAX_MESSAGE_SIZE):
+        packets = make_packets(message_size, 8 * MEGABYTE)
+        assert legacy_split(packets) == framer_split(packets)
+        legacy = measure(legacy_split, packets)
+        framer = measure(framer_split, packets)
+        print(f"{message_size:>14} {legacy * 1000:>14.3f} {framer * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
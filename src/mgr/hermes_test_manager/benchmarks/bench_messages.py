@@ -0,0 +1,116 @@
+"""Micro-benchmarks of building, serializing and parsing messages."""
+
+import xml.etree.ElementTree as ET
+
+from ipc_hermes.messages import Message, CheckAliveType, NotificationCode, SeverityType
+from ipc_hermes.messages import BoardQuality, FlippedBoard, TransferState, parse_message
+from ipc_hermes.serializer import MessageTemplate, MessageSerializer, FrameCache
+from ipc_hermes.compact import CompactMessage
+from ipc_hermes.validation import validate
+
+from benchmarks.runner import benchmark
+
+BOARD_ID = '9b2b6f2e-56e1-4c4e-9a0b-7f1d7d6c3a51'
+FORECAST_ID = '0d7b0f4a-8a3e-4c55-b9d2-2bb5e0c4f3a7'
+
+FACTORIES = {
+    'CheckAlive': lambda: Message.CheckAlive(CheckAliveType.PING, 1),
+    'ServiceDescription': lambda: Message.ServiceDescription('Benchmark', '1'),
+    'Notification': lambda: Message.Notification(NotificationCode.PROTOCOL_ERROR,
+                                                 SeverityType.FATAL, 'Benchmark'),
+    'BoardAvailable': lambda: Message.BoardAvailable(BOARD_ID, 'Benchmark', BoardQuality.GOOD,
+                                                     'Product', FlippedBoard.TOP_SIDE_IS_UP,
+                                                     'TOP123', 'BOTTOM123', 250.0, 120.0, 1.6),
+    'BoardForecast': lambda: Message.BoardForecast(FORECAST_ID, 10.0, BOARD_ID, 'Benchmark'),
+    'RevokeBoardAvailable': Message.RevokeBoardAvailable,
+    'MachineReady': lambda: Message.MachineReady(BoardQuality.GOOD),
+    'RevokeMachineReady': Message.RevokeMachineReady,
+    'StartTransport': lambda: Message.StartTransport(BOARD_ID),
+    'StopTransport': lambda: Message.StopTransport(TransferState.COMPLETE, BOARD_ID),
+    'TransportFinished': lambda: Message.TransportFinished(TransferState.COMPLETE, BOARD_ID),
+}
+
+
+def _register_factory(name: str, factory) -> None:
+    @benchmark(f'factory.{name}')
+    def build():
+        return factory
+
+
+for _name, _factory in FACTORIES.items():
+    _register_factory(_name, _factory)
+
+
+@benchmark('message.to_bytes')
+def to_bytes():
+    """Serialize a BoardAvailable message."""
+    return FACTORIES['BoardAvailable']().to_bytes
+
+
+@benchmark('message.repr')
+def canonical_repr():
+    """Canonical XML of a BoardAvailable message, as logged before summaries."""
+    return FACTORIES['BoardAvailable']().__repr__
+
+
+@benchmark('message.parse')
+def parse():
+    """Parse a received BoardAvailable frame with ElementTree."""
+    msg_bytes = FACTORIES['BoardAvailable']().to_bytes()
+    return lambda: ET.fromstring(msg_bytes)
+
+
+@benchmark('message.parse_and_wrap')
+def parse_and_wrap():
+    """Parse a received frame into a Message and read its tag."""
+    msg_bytes = FACTORIES['BoardAvailable']().to_bytes()
+    return lambda: Message(ET.fromstring(msg_bytes)).tag
+
+
+@benchmark('serializer.template')
+def template_render():
+    """Render a BoardAvailable template with a new BoardId."""
+    template = MessageTemplate(FACTORIES['BoardAvailable']())
+    return lambda: template.render(BoardId=BOARD_ID)
+
+
+@benchmark('serializer.serialize')
+def serializer_serialize():
+    """Serialize StopTransport from its tag and attributes."""
+    serializer = MessageSerializer()
+    return lambda: serializer.serialize('StopTransport', {'TransferState': TransferState.COMPLETE.value,
+                                                          'BoardId': BOARD_ID})
+
+
+@benchmark('message.parse_lazy')
+def parse_lazy():
+    """Scan a received frame into a LazyMessage and read its tag."""
+    msg_bytes = FACTORIES['BoardAvailable']().to_bytes()
+    return lambda: parse_message(msg_bytes).tag
+
+
+@benchmark('message.compact')
+def compact():
+    """Compact a message and expand it again."""
+    msg = FACTORIES['BoardAvailable']()
+    return lambda: CompactMessage.from_message(msg).to_message()
+
+
+@benchmark('serializer.cached_frame')
+def cached_frame():
+    """Serialize a cached ServiceDescription, only the timestamp is new."""
+    frames = FrameCache()
+    return lambda: frames.get(Message.ServiceDescription, 'Benchmark', '1').to_bytes()
+
+
+@benchmark('message.summary')
+def summary():
+    """One line log format of a BoardAvailable message."""
+    return FACTORIES['BoardAvailable']().summary
+
+
+@benchmark('message.validate')
+def validate_fields():
+    """Validate all fields of a BoardAvailable message."""
+    msg = FACTORIES['BoardAvailable']()
+    return lambda: validate(msg, '1.4')
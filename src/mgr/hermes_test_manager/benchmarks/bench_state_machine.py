@@ -0,0 +1,78 @@
+"""Micro-benchmarks of the state machine transitions of a board transfer."""
+
+from ipc_hermes.messages import Message, Tag, TransferState
+from ipc_hermes.state_machine import UpstreamStateMachine, DownstreamStateMachine
+
+from benchmarks.runner import benchmark
+
+BOARD_ID = '9b2b6f2e-56e1-4c4e-9a0b-7f1d7d6c3a51'
+CYCLES = 100
+TRANSITIONS = 5  # per board transfer
+
+
+def _connected(state_machine, send_first: bool):
+    """Exchange ServiceDescriptions, the upstream side sends first."""
+    service_description = Message.ServiceDescription('Benchmark', '1')
+    if send_first:
+        state_machine.on_send_tag(Tag.SERVICE_DESCRIPTION, True)
+        state_machine.on_recv(service_description)
+    else:
+        state_machine.on_recv(service_description)
+        state_machine.on_send_tag(Tag.SERVICE_DESCRIPTION, True)
+    return state_machine
+
+
+@benchmark('state_machine.upstream_cycle', ops=CYCLES * TRANSITIONS)
+def upstream_cycle():
+    """Transitions of a board transfer in the UpstreamStateMachine, which sends MachineReady."""
+    state_machine = _connected(UpstreamStateMachine(), True)
+    board_available = Message.BoardAvailable(BOARD_ID, 'Benchmark')
+    transport_finished = Message.TransportFinished(TransferState.COMPLETE, BOARD_ID)
+
+    def cycles():
+        for _ in range(CYCLES):
+            state_machine.on_send_tag(Tag.MACHINE_READY, True)
+            state_machine.on_recv(board_available)
+            state_machine.on_send_tag(Tag.START_TRANSPORT, True)
+            state_machine.on_recv(transport_finished)
+            state_machine.on_send_tag(Tag.STOP_TRANSPORT, True)
+    return cycles
+
+
+@benchmark('state_machine.downstream_cycle', ops=CYCLES * TRANSITIONS)
+def downstream_cycle():
+    """Transitions of a board transfer in the DownstreamStateMachine, which sends BoardAvailable."""
+    state_machine = _connected(DownstreamStateMachine(), False)
+    machine_ready = Message.MachineReady()
+    start_transport = Message.StartTransport(BOARD_ID)
+    stop_transport = Message.StopTransport(TransferState.COMPLETE, BOARD_ID)
+
+    def cycles():
+        for _ in range(CYCLES):
+            state_machine.on_send_tag(Tag.BOARD_AVAILABLE, True)
+            state_machine.on_recv(machine_ready)
+            state_machine.on_recv(start_transport)
+            state_machine.on_send_tag(Tag.TRANSPORT_FINISHED, True)
+            state_machine.on_recv(stop_transport)
+    return cycles
+
+
+@benchmark('state_machine.unchanged', ops=CYCLES)
+def unchanged():
+    """Messages without a transition, e.g. CheckAlive, the most frequent case."""
+    state_machine = _connected(UpstreamStateMachine(), True)
+    check_alive = Message.CheckAlive()
+
+    def cycles():
+        for _ in range(CYCLES):
+            state_machine.on_recv(check_alive)
+    return cycles
+
+
+@benchmark('state_machine.check_trace', ops=CYCLES * TRANSITIONS)
+def check_trace():
+    """Offline check of a captured trace, (tag, sent) pairs from the upstream side."""
+    cycle = [(Tag.MACHINE_READY, True), (Tag.BOARD_AVAILABLE, False), (Tag.START_TRANSPORT, True),
+             (Tag.TRANSPORT_FINISHED, False), (Tag.STOP_TRANSPORT, True)]
+    trace = [(Tag.SERVICE_DESCRIPTION, True), (Tag.SERVICE_DESCRIPTION, False)] + cycle * CYCLES
+    return lambda: UpstreamStateMachine().check_trace(trace)
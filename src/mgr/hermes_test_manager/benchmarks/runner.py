@@ -0,0 +1,98 @@
+"""Registry and runner of the micro-benchmarks.
+
+A benchmark is a setup function registered with the benchmark decorator.
+It prepares its data and returns the callable to be timed, ops is the
+number of operations done by one call:
+
+    @benchmark('message.to_bytes')
+    def to_bytes():
+        msg = Message.BoardAvailable(board_id, 'Benchmark')
+        return msg.to_bytes
+
+Results are the best time per operation in nanoseconds over a number of
+repeats, and can be saved as JSON and compared with a saved baseline.
+"""
+
+import re
+import sys
+import json
+import timeit
+import platform
+import collections
+
+REPEAT = 5
+THRESHOLD = 0.10  # relative slowdown reported as regression
+
+Benchmark = collections.namedtuple('Benchmark', ['name', 'setup', 'ops'])
+Comparison = collections.namedtuple('Comparison', ['name', 'baseline_ns', 'ns', 'change'])
+
+BENCHMARKS = {}  # name: Benchmark, in registration order
+
+
+def benchmark(name: str, ops: int = 1):
+    """Decorator registering a setup function returning the callable to be timed."""
+    def register(setup):
+        if name in BENCHMARKS:
+            raise ValueError(f"Duplicate benchmark name: {name}")
+        BENCHMARKS[name] = Benchmark(name, setup, ops)
+        return setup
+    return register
+
+
+def select(pattern: str = None) -> list:
+    """Registered benchmarks whose name matches the regular expression, all by default."""
+    if pattern is None:
+        return list(BENCHMARKS.values())
+    regex = re.compile(pattern)
+    return [bench for bench in BENCHMARKS.values() if regex.search(bench.name)]
+
+
+def measure(bench: Benchmark, repeat: int = REPEAT) -> float:
+    """Best time per operation in nanoseconds, each repeat runs at least 0.2 seconds."""
+    timer = timeit.Timer(bench.setup())
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat, number))
+    return best * 1e9 / (number * bench.ops)
+
+
+def run(benchmarks: list, repeat: int = REPEAT, progress=None) -> dict:
+    """Measure the benchmarks and return the results, as saved by save().
+       progress is called with the name and time per operation of each benchmark.
+    """
+    results = {}
+    for bench in benchmarks:
+        results[bench.name] = measure(bench, repeat)
+        if progress is not None:
+            progress(bench.name, results[bench.name])
+    return {'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'repeat': repeat,
+            'ns_per_op': results}
+
+
+def save(results: dict, filename: str) -> None:
+    """Write results as JSON."""
+    with open(filename, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+
+
+def load(filename: str) -> dict:
+    """Read results written by save()."""
+    with open(filename, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """Comparison per benchmark present in both, change is the relative slowdown."""
+    comparisons = []
+    for name, ns in results['ns_per_op'].items():
+        baseline_ns = baseline['ns_per_op'].get(name)
+        if baseline_ns:
+            comparisons.append(Comparison(name, baseline_ns, ns, ns / baseline_ns - 1.0))
+    return comparisons
+
+
+def regressions(comparisons: list, threshold: float = THRESHOLD) -> list:
+    """Comparisons slower than the baseline by more than the threshold."""
+    return [comparison for comparison in comparisons if comparison.change > threshold]
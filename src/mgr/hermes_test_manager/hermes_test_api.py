@@ -1,6 +1,7 @@
 """API for IPC-Hermes-9852 interface test manager."""
 import os
 import sys
+import atexit
 import logging
 import hashlib
 from enum import Enum
@@ -12,6 +13,12 @@ sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 from test_cases import get_test_dictionary
 from test_cases import EnvironmentManager
 from callback_tags import CbEvt
+from load_generator import LoadGenerator, LoadDirection, LoadReport
+from replay import Replayer, ReplaySide, ReplayReport
+from log_queue import LogQueue, BatchFileHandler
+from ipc_hermes.latency import LatencyRecorder
+from ipc_hermes.capture import CaptureWriter
+from ipc_hermes.messages import LogFormat
 
 # imports are needed to locate available tests but not used directly by API
 # pylint: disable=unused-import
@@ -23,6 +30,7 @@ import test_cases.test_upstream_ifc_interactive
 import test_cases.test_bothstream_interactive
 
 log = logging.getLogger('hermes_test_api')
+_log_queue = None
 
 
 class TestResult(Enum):
@@ -71,6 +79,7 @@ def run_test(testcase: str, callback=None, verbose=False) -> bool:
     test_data = get_test_dictionary().get(testcase)
     func = test_data[0]
     if func is not None:
+        env.latency_recorder.reset()
         try:
             log.info("Start %s.%s...", test_data[1], testcase)
             func()
@@ -86,6 +95,78 @@ def run_test(testcase: str, callback=None, verbose=False) -> bool:
     log.error("Called unknown test case: %s", testcase)
     return False
 
+def latency_results() -> LatencyRecorder:
+    """Response latency histograms of the system under test recorded during the last test case.
+       Results of several runs can be combined with LatencyRecorder.merge,
+       or saved with to_dict and restored with LatencyRecorder.from_dict.
+    """
+    results = LatencyRecorder()
+    results.merge(EnvironmentManager().latency_recorder)
+    return results
+
+def start_capture(filename: str) -> None:
+    """Record the raw bytes of all connections of the following test cases to a capture file,
+       read it with ipc_hermes.capture.CaptureReader.
+    """
+    stop_capture()
+    EnvironmentManager().capture = CaptureWriter(filename)
+    log.info("Capture started: %s", filename)
+
+def stop_capture() -> None:
+    """Close the capture file, if any."""
+    env = EnvironmentManager()
+    if env.capture is not None:
+        env.capture.close()
+        log.info("Capture stopped: %s, %s records", env.capture.path, len(env.capture))
+        env.capture = None
+
+def run_load(direction: LoadDirection | str, duration_secs: float, cycles_per_second: float = None,
+             callback=None) -> LoadReport:
+    """Repeat complete board transfers with the system under test for a set duration.
+
+    Args:
+        direction: Board transport direction, LoadDirection.TO_SUT or LoadDirection.FROM_SUT,
+            or its name e.g., 'to_sut'.
+        duration_secs: Duration of the run.
+        cycles_per_second: Target rate, default None is as fast as possible.
+        callback: Called with CbEvt.PROGRESS and the LoadReport so far during the run.
+
+    Return: LoadReport with boards per hour, cycle time percentiles and protocol errors.
+    """
+    if isinstance(direction, str):
+        direction = LoadDirection[direction.upper()]
+    env = EnvironmentManager()
+    if direction is LoadDirection.TO_SUT:
+        host, port = 'localhost', int(env.test_manager_port)
+    else:
+        host, port = env.system_under_test_host, env.system_under_test_port
+
+    def progress(report: LoadReport) -> None:
+        if callback is not None:
+            text = (f"{report.cycles} boards, {report.boards_per_hour:.0f} boards per hour, "
+                    f"{len(report.errors)} errors")
+            callback(text, 'run_load', CbEvt.PROGRESS, report=report)
+
+    generator = LoadGenerator(direction, host, port, env.machine_id, env.lane_id,
+                              cycles_per_second, progress=progress)
+    return generator.run(duration_secs)
+
+def run_replay(filename: str, speed: float = 1.0, connection_id: int = None) -> ReplayReport:
+    """Replay a captured connection against the system under test, see start_capture.
+
+    Args:
+        filename: Capture file.
+        speed: Gaps between messages are divided by speed, None replays as fast as possible.
+        connection_id: Connection to replay, default the first one in the capture.
+
+    Return: ReplayReport with the differences between received and captured messages.
+    """
+    env = EnvironmentManager()
+    replayer = Replayer(filename, connection_id, speed=speed)
+    if replayer.side is ReplaySide.DOWNSTREAM:
+        return replayer.run('localhost', int(env.test_manager_port))
+    return replayer.run(env.system_under_test_host, env.system_under_test_port)
+
 def system_under_test_address(host:str, port:str|int):
     """Set the IP address of the system under test."""
     env = EnvironmentManager()
@@ -99,18 +180,39 @@ def testmanager_listening_port(port:str|int):
     env.test_manager_port = port
     log.debug("Test manager listening port: %s", port)
 
-def setup_default_logging(filename: str, level=logging.INFO, extra_loggers: list=None) -> None:
-    """Optional setup of logging to file."""
+def setup_default_logging(filename: str, level=logging.INFO, extra_loggers: list=None,
+                          message_format: LogFormat=LogFormat.SUMMARY, queued: bool=False) -> None:
+    """Optional setup of logging to file.
+       Sent and received messages are logged at INFO level as a one line summary,
+       or as XML with message_format LogFormat.XML.
+       With queued set, records are written by a background thread, so a slow disk
+       does not delay sending and receiving, see log_queue.LogQueue. Records still
+       queued are written at exit.
+    """
+    global _log_queue  # pylint: disable=global-statement
+    EnvironmentManager().log_format = message_format
     formatter = logging.Formatter('%(asctime)-19s.%(msecs)-3d [%(name)-15s] %(levelname)s: %(message)s',
                                   '%Y-%m-%dT%H:%M:%S')
-    file_handler = logging.FileHandler(filename, mode='w', encoding='utf-8')
-    file_handler.setFormatter(formatter)
     loggers = ['hermes_test_api','ipc_hermes','test_cases']
     loggers.extend(extra_loggers or [])
+    if _log_queue is not None:
+        for log_name in loggers:
+            logging.getLogger(log_name).removeHandler(_log_queue.handler)
+        _log_queue.stop()
+        _log_queue = None
+    if queued:
+        file_handler = BatchFileHandler(filename, mode='w', encoding='utf-8')
+        file_handler.setFormatter(formatter)
+        _log_queue = LogQueue(file_handler)
+        atexit.register(_log_queue.stop)
+        handler = _log_queue.handler
+    else:
+        handler = logging.FileHandler(filename, mode='w', encoding='utf-8')
+        handler.setFormatter(formatter)
     for log_name in loggers:
         logger = logging.getLogger(log_name)
         logger.setLevel(level)
-        logger.addHandler(file_handler)
+        logger.addHandler(handler)
 
 if __name__ == '__main__':
     # Print a list of available tests and some usage hints, any CLI should be in another file
@@ -0,0 +1,371 @@
+"""asyncio based connection classes for IPC-Hermes-9852 interface.
+
+Same behaviour as the classes in ipc_hermes.connections but without a
+thread per connection, so a single event loop can drive many lanes:
+
+    conn = AsyncUpstreamConnection()
+    await conn.connect(host, port)
+    await conn.send_msg(Message.ServiceDescription(machine_id, lane_id))
+    msg = await conn.expect_message(Tag.SERVICE_DESCRIPTION)
+    await conn.close()
+"""
+
+import time
+import asyncio
+import logging
+import xml.etree.ElementTree as ET
+
+from ipc_hermes.messages import Message, Tag, NotificationCode, SeverityType, parse_message
+from ipc_hermes.messages import LogFormat, LoggedMessage
+from ipc_hermes.framing import MessageFramer
+from ipc_hermes.mailbox import Mailbox, OverflowPolicy
+from ipc_hermes.pacing import Pacing
+from ipc_hermes.latency import LatencyRecorder
+from ipc_hermes.capture import CaptureWriter, Direction
+from ipc_hermes.state_machine import UpstreamStateMachine, DownstreamStateMachine
+from ipc_hermes.connections import ConnectionLost, SOCKET_TIMEOUT, RECEIVE_TIMEOUT, _connection_ids
+
+REFUSE_DELAY = 0.1
+
+
+class _HermesProtocol(asyncio.BufferedProtocol):
+    """Receives into the framer of its connection and forwards complete messages."""
+    def __init__(self, connection):
+        self._connection = connection
+        self._framer = MessageFramer()
+        self._buffer = None
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._connection._connection_made(self)
+
+    def get_buffer(self, sizehint):
+        self._buffer = self._framer.get_buffer()
+        return self._buffer
+
+    def buffer_updated(self, nbytes):
+        if self._connection.capture is not None:
+            with self._buffer[:nbytes] as received:
+                self._connection._capture_received(self, received)
+        self._framer.buffer_updated(nbytes)
+        try:
+            for frame in self._framer.frames():
+                with frame:
+                    if self._connection.lazy_parse:
+                        msg = parse_message(frame)
+                    else:
+                        msg = Message(ET.fromstring(frame))
+                self._connection._message_received(self, msg)
+        except IOError as exc:
+            self._connection._log.debug('IOError in protocol: %s', exc)
+            self._connection._connection_lost(self, exc)
+            self.transport.abort()
+
+    def connection_lost(self, exc):
+        self._connection._connection_lost(self, exc)
+
+
+class AsyncClientServer:
+    """Base class for asyncio client and server."""
+    def __init__(self):
+        self._protocol = None
+        self._state_machine = None
+        self._mailbox = Mailbox()
+        self._paused = False
+        self._latency = None
+        self._reply_tracker = None
+        self._connection_id = next(_connection_ids)
+        self._changed = asyncio.Event()
+        self._log = logging.getLogger('ipc_hermes')
+        self._listener_exception = None
+        self.strict_send_protocol = True
+        self.pacing: Pacing = None
+        self.capture: CaptureWriter = None
+        self.lazy_parse = True  # see messages.parse_message
+        self.log_format = LogFormat.SUMMARY  # of sent and received messages at INFO level
+
+    async def connect(self, host:str, port:str|int) -> None:
+        """Initiate the connection. To be overridden by subclasses."""
+
+    @property
+    def connection_id(self) -> int:
+        """Process-wide unique id of the connection, used in captures.
+           A downstream server gets a new id for each accepted client.
+        """
+        return self._connection_id
+
+    @property
+    def latency(self) -> LatencyRecorder:
+        """Recorder of the response latency of the other end, None to disable."""
+        return self._latency
+
+    @latency.setter
+    def latency(self, recorder:LatencyRecorder):
+        self._latency = recorder
+        self._reply_tracker = recorder.tracker() if recorder is not None else None
+
+    async def close(self) -> None:
+        """Close the connection."""
+        self._log.debug('Shutting down connection transport')
+        self._log.debug('Mailbox high water mark: %s, dropped messages: %s',
+                        self._mailbox.high_water_mark, self._mailbox.dropped)
+        if self._protocol is not None:
+            self._protocol.transport.close()
+            self._log.debug('Connection transport closed')
+
+    async def send_msg(self, msg:Message) -> int:
+        """Send a message."""
+        assert self._protocol is not None, 'No connection established'
+        if self._log.isEnabledFor(logging.INFO):
+            self._log.info('Try send: %s', LoggedMessage(msg, self.log_format))
+        return await self._send_bytes(msg.tag, msg.to_bytes(), msg)
+
+    async def send_tag_and_bytes(self, tag:Tag, msg_bytes:bytes) -> int:
+        """Send a byte message. Allows protocol violations to be created, for testing only."""
+        assert self._protocol is not None, 'No connection established'
+        self._log.info('Try send %s bytes, "%s"', len(msg_bytes), tag)
+        return await self._send_bytes(tag, msg_bytes)
+
+    async def _send_bytes(self, tag:Tag, msg_bytes:bytes, msg:Message=None) -> int:
+        """Queue a byte message on the transport."""
+        self._raise_on_listener_exception()
+        self._state_machine.on_send_tag(tag, self.strict_send_protocol)
+        if self.pacing is not None:
+            await asyncio.sleep(self.pacing.delay())
+        if self._reply_tracker is not None:
+            self._reply_tracker.sent(tag, msg, time.perf_counter_ns())
+        self._protocol.transport.write(msg_bytes)
+        if self.capture is not None:
+            self.capture.record(self._connection_id, Direction.SEND, msg_bytes)
+        if self.pacing is not None:
+            self.pacing.after_send()
+        return len(msg_bytes)
+
+    def _raise_on_listener_exception(self) -> None:
+        """Report a failure of the transport to the sending task."""
+        if self._listener_exception is not None:
+            raise ConnectionLost('Listener exception', self._listener_exception) from self._listener_exception
+
+    @property
+    def mailbox(self) -> Mailbox:
+        """Received messages not yet taken by expect_message.
+           Its max_retained and policy bound the memory used by unexpected messages.
+        """
+        return self._mailbox
+
+    async def expect_message(self, tag, timeout_secs=RECEIVE_TIMEOUT, predicate=None) -> Message:
+        """Wait for a message with the given tag, optionally matching the predicate,
+           other messages are kept for later calls. A tag of None accepts any message,
+           a timeout of None waits until the connection is lost.
+           Raises ConnectionLost once the connection is lost and no matching message is left,
+           or when a downstream server accepted a new client meanwhile.
+        """
+        self._log.debug('Wait for expected message: %s', tag)
+        try:
+            return await asyncio.wait_for(self._next_message(tag, predicate), timeout_secs)
+        except asyncio.TimeoutError:
+            self._log.debug('Timed out after %ss waiting for message: %s', timeout_secs, tag)
+            raise ConnectionLost(f"Expected message <{tag}>, but timed out after {timeout_secs} seconds") from None
+
+    async def _next_message(self, tag, predicate) -> Message:
+        """Feed received messages to the state machine in arrival order until a matching one is found."""
+        connection_id = self._connection_id
+        while True:
+            if self._connection_id != connection_id:
+                raise ConnectionLost('Connection closed by peer, replaced by a new client')
+            msg = self._mailbox.take(tag, predicate)
+            if msg is not None:
+                if self._paused and not self._mailbox.full:
+                    self._log.debug('Mailbox has room, resume reading')
+                    self._paused = False
+                    self._protocol.transport.resume_reading()
+                self._log.debug('Received expected message: %s', msg.tag)
+                return msg
+            observed = self._mailbox.observe()
+            if observed is not None:
+                self._state_machine.on_recv(observed)
+                continue
+            self._raise_on_listener_exception()
+            self._changed.clear()
+            await self._changed.wait()
+
+    async def wait_for_disconnect(self, timeout_secs=SOCKET_TIMEOUT) -> bool:
+        """Wait until the other end has closed the connection.
+           Returns False if the connection is still open after timeout.
+        """
+        try:
+            await asyncio.wait_for(self._wait_until(lambda: self._listener_exception is not None),
+                                   timeout_secs)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def _wait_until(self, predicate) -> None:
+        """Wait until the predicate is true, it is checked after each change of the connection.
+           All tasks run in the same event loop, so no locking is needed.
+        """
+        while not predicate():
+            self._changed.clear()
+            await self._changed.wait()
+
+    def _connection_made(self, protocol:_HermesProtocol) -> None:
+        """Called by the protocol when the transport is connected."""
+        self._protocol = protocol
+
+    def _capture_received(self, protocol:_HermesProtocol, data:memoryview) -> None:
+        """Called by the protocol with received bytes before they are parsed."""
+        if protocol is self._protocol:
+            self.capture.record(self._connection_id, Direction.RECV, data)
+
+    def _message_received(self, protocol:_HermesProtocol, msg:Message) -> None:
+        """Called by the protocol for each received message.
+           A full mailbox pauses reading or raises MailboxOverflow, depending on its policy.
+        """
+        if self._log.isEnabledFor(logging.INFO):
+            self._log.info('Received: %s', LoggedMessage(msg, self.log_format))
+        if self._reply_tracker is not None:
+            self._reply_tracker.received(msg.tag, msg, time.perf_counter_ns())
+        self._mailbox.put(msg)
+        self._changed.set()
+        if (self._mailbox.full and self._mailbox.policy is OverflowPolicy.BLOCK
+                and not self._paused):
+            self._log.debug('Mailbox full, pause reading')
+            self._paused = True
+            protocol.transport.pause_reading()
+
+    def _connection_lost(self, protocol:_HermesProtocol, exc:Exception) -> None:
+        """Called by the protocol when the connection is closed or failed."""
+        if protocol is not self._protocol or self._listener_exception is not None:
+            return
+        self._log.debug('Connection lost: %s', exc)
+        self._listener_exception = exc or ConnectionLost('Connection closed by peer')
+        self._changed.set()
+
+
+class AsyncUpstreamConnection(AsyncClientServer):
+    """Creating a connection from upstream client to a downstream IPC-Hermes-9852 server."""
+
+    async def connect(self, host:str, port:str|int) -> None:
+        """Initiate the upstream connection and start receiving."""
+        self._log.debug('Trying to open connection to downstream server: %s:%s', host, port)
+        self._state_machine = UpstreamStateMachine()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(loop.create_connection(lambda: _HermesProtocol(self), host, port),
+                                   SOCKET_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as exc:
+            raise ConnectionLost(f"Cannot connect to {host}:{port} - {exc}") from exc
+        self._log.debug('Connection to downstream server successfully opened: %s:%s', host, port)
+
+
+class AsyncDownstreamConnection(AsyncClientServer):
+    """Creating a downstream server to allow multiple async connections
+       from upstream IPC-Hermes-9852 clients. Only one will be allowed though.
+    """
+    def __init__(self):
+        self._server = None
+        self._client_address = None
+        self._client_connected = False
+        self._connection_count = 0
+        super().__init__()
+
+    async def connect(self, host:str, port:str|int) -> None:
+        """Start the downstream server. Get ready to accept connections."""
+        address = (host, port)
+        self._log.debug('Trying to start a downstream server: %s', address)
+        self._state_machine = DownstreamStateMachine()
+        loop = asyncio.get_running_loop()
+        self._server = await loop.create_server(lambda: _HermesProtocol(self), host, port,
+                                                reuse_address=True, backlog=5)
+        self._log.debug('Downstream server successfully started')
+
+    @property
+    def connection_count(self) -> int:
+        """Number of upstream clients accepted since the server was started."""
+        return self._connection_count
+
+    async def wait_for_connection(self, timeout_secs=SOCKET_TIMEOUT, connection_number:int=None) -> str:
+        """Wait for a connection to the downstream server and return the client address.
+           Args:
+                connection_number (int) default None, wait for a connected client.
+                    Otherwise wait for the Nth client accepted since the server was started.
+        """
+        self._log.debug('Waiting for upstream client to connect')
+
+        def connected() -> bool:
+            if connection_number is None:
+                return self._client_connected
+            return self._connection_count >= connection_number
+
+        try:
+            await asyncio.wait_for(self._wait_until(connected), timeout_secs)
+        except asyncio.TimeoutError:
+            self._log.debug('Timeout waiting for upstream client')
+            raise ConnectionLost(f"Upstream client did not connect within {timeout_secs} seconds") from None
+        return str(self._client_address)
+
+    def close_client(self) -> None:
+        """Close the connection of the current upstream client, e.g. after a protocol error.
+           Data already sent is flushed first, the server keeps accepting clients.
+        """
+        if self._client_connected:
+            self._log.debug('Closing upstream client connection: %s', self._client_address)
+            self._protocol.transport.close()
+
+    def _connection_made(self, protocol:_HermesProtocol, deferred:bool=False) -> None:
+        """The IPC-Hermes-9852 protocol only allows one client.
+           So, accept the first and deny all others by sending a Notification.
+           A new client is accepted once the previous one has closed its connection.
+           A client reconnecting right after closing may be accepted before the close
+           of its previous connection is processed, so the refusal is decided
+           REFUSE_DELAY seconds later.
+        """
+        if self._client_connected and not deferred:
+            protocol.transport.pause_reading()
+            asyncio.get_running_loop().call_later(REFUSE_DELAY, self._connection_made, protocol, True)
+            return
+        if deferred and not protocol.transport.is_closing():
+            protocol.transport.resume_reading()
+        client_address = protocol.transport.get_extra_info('peername')
+        self._log.debug('Verifying a connection request: %s', client_address)
+        if not self._client_connected:
+            if self._protocol is not None:
+                self._log.debug('Replacing closed upstream transport')
+                self._state_machine = DownstreamStateMachine()
+                if self._reply_tracker is not None:
+                    self._reply_tracker.reset()
+                self._connection_id = next(_connection_ids)
+                # messages of the previous session would confuse the new state machine
+                self._mailbox.clear()
+                self._paused = False
+            self._protocol = protocol
+            self._client_address = client_address
+            self._client_connected = True
+            self._connection_count += 1
+            self._listener_exception = None
+            self._log.debug('Upstream transport created')
+            self._changed.set()
+            return
+
+        self._log.debug('Refuse second connection, already connected')
+        msg = Message.Notification(NotificationCode.CONNECTION_REFUSED,
+                                   SeverityType.ERROR,
+                                   'Connection refused because of an established connection')
+        protocol.transport.write(msg.to_bytes())
+        protocol.transport.close()
+
+    def _connection_lost(self, protocol:_HermesProtocol, exc:Exception) -> None:
+        """The upstream client closed the connection, allow the next one to connect."""
+        if protocol is self._protocol:
+            self._client_connected = False
+        super()._connection_lost(protocol, exc)
+
+    async def close(self) -> None:
+        """Stop accepting connections and close the server."""
+        self._log.debug('Shutting down downstream server')
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._log.debug('Server closed')
+        await super().close()
@@ -0,0 +1,271 @@
+"""Binary capture of the bytes sent and received by IPC-Hermes-9852 connections.
+
+A CaptureWriter assigned to ClientServer.capture records every send and
+receive call with a monotonic timestamp, the connection id and the
+direction. Records are appended to a memory-mapped file, so recording is
+a copy into memory and the operating system writes the file in the
+background:
+
+    with CaptureWriter('session.hcap') as capture:
+        connection.capture = capture
+        ...
+    with CaptureReader('session.hcap') as reader:
+        print(len(reader), reader[0])
+        print(reader.message_count(), reader.message(0))
+        for record in reader.messages(direction=Direction.RECV):
+            print(record.data)
+
+File layout, all integers little-endian:
+    header:  magic, end of records, offset of index (0 until closed), number of records
+    records: timestamp ns, connection id, data length, direction, data
+    index:   offset of each record, written on close
+A file that was not closed, e.g. after a crash, is indexed by scanning the records.
+Records hold the bytes of one socket call, a message may span several records
+and a record may hold several messages. The reader frames the records once to
+index the messages, on first access to a message by number.
+Records are stored in the order they were written, the timestamp of a send is taken
+before the socket call, so timestamps of different threads may be slightly out of order.
+"""
+
+import sys
+import mmap
+import time
+import struct
+import threading
+import collections
+from array import array
+from enum import IntEnum
+
+from ipc_hermes.framing import MessageFramer
+
+MAGIC = b'HRMSCAP1'
+CHUNK_SIZE = 1 << 20
+_HEADER = struct.Struct('<8sQQQ')
+_RECORD = struct.Struct('<QIIB3x')
+
+CaptureRecord = collections.namedtuple('CaptureRecord',
+                                       ['timestamp_ns', 'connection_id', 'direction', 'data'])
+
+
+class Direction(IntEnum):
+    """Direction of the captured bytes."""
+    SEND = 0
+    RECV = 1
+
+
+class CaptureWriter:
+    """Append-only writer of a capture file. Thread-safe, one writer
+       can be shared by all connections. Records after close are ignored.
+
+    Args:
+        path (str): File to create, an existing file is overwritten.
+        chunk_size (int): The file grows by at least this many bytes at a time.
+    """
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self._chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._offsets = array('Q')
+        self._end = _HEADER.size
+        self._file = open(path, 'w+b')  # pylint: disable=consider-using-with
+        self._size = max(chunk_size, _HEADER.size)
+        self._file.truncate(self._size)
+        self._map = mmap.mmap(self._file.fileno(), self._size)
+        _HEADER.pack_into(self._map, 0, MAGIC, self._end, 0, 0)
+
+    def __len__(self) -> int:
+        """Number of records written."""
+        return len(self._offsets)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, connection_id: int, direction: Direction, data, timestamp_ns: int = None) -> None:
+        """Append the bytes-like data, timestamp defaults to time.monotonic_ns()."""
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        size = len(data)
+        with self._lock:
+            if self._map is None:
+                return
+            start = self._end + _RECORD.size
+            end = start + size
+            if end > self._size:
+                self._grow(end)
+            _RECORD.pack_into(self._map, self._end, timestamp_ns, connection_id, size, direction)
+            self._map[start:end] = data
+            self._offsets.append(self._end)
+            self._end = end
+            _HEADER.pack_into(self._map, 0, MAGIC, end, 0, len(self._offsets))
+
+    def flush(self) -> None:
+        """Write the records to disk now."""
+        with self._lock:
+            if self._map is not None:
+                self._map.flush()
+
+    def close(self) -> None:
+        """Append the index and truncate the file to its content."""
+        with self._lock:
+            if self._map is None:
+                return
+            index = array('Q', self._offsets)
+            if sys.byteorder != 'little':
+                index.byteswap()
+            index_bytes = index.tobytes()
+            end = self._end + len(index_bytes)
+            if end > self._size:
+                self._grow(end)
+            self._map[self._end:end] = index_bytes
+            _HEADER.pack_into(self._map, 0, MAGIC, self._end, self._end, len(self._offsets))
+            self._map.close()
+            self._map = None
+            self._file.truncate(end)
+            self._file.close()
+
+    def _grow(self, needed: int) -> None:
+        """Enlarge the file and map it again, resize() is not available on all platforms."""
+        self._size = max(2 * self._size, needed + self._chunk_size)
+        self._map.close()
+        self._file.truncate(self._size)
+        self._map = mmap.mmap(self._file.fileno(), self._size)
+
+
+class CaptureReader:
+    """Random access to the records of a capture file, reader[n] is record n
+       and reader.message(n) is message n.
+
+    Args:
+        path (str): Capture file written by CaptureWriter.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._end, index_offset, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"Not a capture file: {path}")
+        self._offsets = array('Q')
+        if index_offset:
+            self._offsets.frombytes(self._map[index_offset:index_offset + 8 * count])
+            if sys.byteorder != 'little':
+                self._offsets.byteswap()
+        else:
+            self._scan()
+        self._messages = None  # (first record, offset in it, size, completing record) arrays
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> CaptureRecord:
+        offset = self._offsets[index]
+        timestamp_ns, connection_id, size, direction = _RECORD.unpack_from(self._map, offset)
+        start = offset + _RECORD.size
+        return CaptureRecord(timestamp_ns, connection_id, Direction(direction),
+                             self._map[start:start + size])
+
+    def __iter__(self):
+        for index in range(len(self._offsets)):
+            yield self[index]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def connection_ids(self) -> list:
+        """Ids of all connections in the capture, in order of appearance."""
+        ids = {}
+        for offset in self._offsets:
+            ids.setdefault(_RECORD.unpack_from(self._map, offset)[1], None)
+        return list(ids)
+
+    def messages(self, connection_id: int = None, direction: Direction = None):
+        """Yield a CaptureRecord per complete message, optionally of one connection
+           and direction. The bytes of a connection and direction are framed again,
+           the timestamp is the one of the record completing the message.
+        """
+        framers = {}
+        for record in self:
+            if connection_id is not None and record.connection_id != connection_id:
+                continue
+            if direction is not None and record.direction != direction:
+                continue
+            key = (record.connection_id, record.direction)
+            framer = framers.get(key)
+            if framer is None:
+                framer = framers[key] = MessageFramer()
+            framer.feed(record.data)
+            for frame in framer.frames():
+                with frame:
+                    yield record._replace(data=bytes(frame))
+
+    def message_count(self) -> int:
+        """Number of complete messages in the capture."""
+        return len(self._message_index()[0])
+
+    def message(self, index: int) -> CaptureRecord:
+        """Message n as yielded by messages() without arguments, i.e. of all
+           connections and directions in the order they were completed.
+        """
+        first, offsets, sizes, last = self._message_index()
+        record_index = first[index]
+        size = sizes[index]
+        record = self[record_index]
+        start = offsets[index]
+        data = record.data[start:start + size]
+        # the rest of a message spanning records follows in the same connection and direction
+        while len(data) < size:
+            record_index += 1
+            following = self[record_index]
+            if (following.connection_id, following.direction) == (record.connection_id, record.direction):
+                data += following.data[:size - len(data)]
+        return record._replace(timestamp_ns=self[last[index]].timestamp_ns, data=data)
+
+    def close(self) -> None:
+        """Release the file."""
+        self._map.close()
+
+    def _scan(self) -> None:
+        """Build the index of a file that was not closed."""
+        offset = _HEADER.size
+        while offset < self._end:
+            self._offsets.append(offset)
+            offset += _RECORD.size + _RECORD.unpack_from(self._map, offset)[2]
+
+    def _message_index(self) -> tuple:
+        """Position of each message, built by framing all records once."""
+        if self._messages is not None:
+            return self._messages
+        first, offsets, sizes, last = array('Q'), array('Q'), array('Q'), array('Q')
+        streams = {}  # (connection id, direction): framer, records not yet framed completely
+        for record_index, record in enumerate(self):
+            key = (record.connection_id, record.direction)
+            stream = streams.get(key)
+            if stream is None:
+                stream = streams[key] = (MessageFramer(), collections.deque())
+            framer, pending = stream
+            # pending records as [record index, first unframed byte, size]
+            pending.append([record_index, 0, len(record.data)])
+            framer.feed(record.data)
+            for frame in framer.frames():
+                with frame:
+                    size = len(frame)
+                first.append(pending[0][0])
+                offsets.append(pending[0][1])
+                sizes.append(size)
+                last.append(record_index)
+                while size:
+                    head = pending[0]
+                    taken = min(size, head[2] - head[1])
+                    head[1] += taken
+                    size -= taken
+                    if head[1] == head[2]:
+                        pending.popleft()
+        self._messages = (first, offsets, sizes, last)
+        return self._messages
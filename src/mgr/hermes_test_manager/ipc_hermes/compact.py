@@ -0,0 +1,152 @@
+"""Compact representation of IPC-Hermes-9852 messages for large in-memory traces.
+
+A Message holds two ElementTree elements and a string per attribute.
+A CompactMessage keeps the timestamp and a tuple of attribute values,
+the tag and attribute names are shared by all messages with the same
+attribute set. Known numeric attributes are stored as int or float if
+that converts back to the same string, so the conversion is lossless:
+
+    trace = [CompactMessage.from_message(msg) for msg in received]
+    print(sum(msg.value('Length') or 0.0 for msg in trace))
+    msg = trace[0].to_message()
+
+Messages that do not fit, e.g. with child elements, are kept as raw bytes.
+CompactMessage has tag, data.get and to_bytes like Message, so mailboxes,
+latency recorders and captures can store it.
+"""
+
+import sys
+import xml.etree.ElementTree as ET
+
+from ipc_hermes.messages import Message, summary_line
+
+FLOAT_ATTRIBUTES = frozenset(('Length', 'Width', 'Thickness', 'ConveyorSpeed', 'TopClearanceHeight',
+                              'BottomClearanceHeight', 'Weight', 'TimeUntilAvailable'))
+INT_ATTRIBUTES = frozenset(('FailedBoard', 'FlippedBoard', 'TransferState', 'NotificationCode',
+                            'Severity', 'Type'))
+# values repeated across messages share one string object
+INTERNED_ATTRIBUTES = frozenset(('BoardIdCreatedBy', 'MachineId', 'LaneId', 'Version',
+                                 'InterfaceId', 'ProductTypeId', 'WorkOrderId'))
+
+
+class _Layout:
+    """Tag and attribute names shared by all messages with the same attribute set."""
+    __slots__ = ('tag', 'names', 'index')
+
+    def __init__(self, tag: str, names: tuple):
+        self.tag = tag
+        self.names = names
+        self.index = {name: position for position, name in enumerate(names)}
+
+
+_layouts = {}  # (tag, names): _Layout
+
+
+def _layout(tag: str, names: tuple) -> _Layout:
+    layout = _layouts.get((tag, names))
+    if layout is None:
+        tag = sys.intern(tag)
+        names = tuple(sys.intern(name) for name in names)
+        layout = _layouts.setdefault((tag, names), _Layout(tag, names))
+    return layout
+
+
+def _compact_value(name: str, text: str):
+    """Typed value of a known attribute if it converts back to the text, else the text."""
+    try:
+        if name in FLOAT_ATTRIBUTES:
+            value = float(text)
+            if str(value) == text:
+                return value
+        elif name in INT_ATTRIBUTES:
+            value = int(text)
+            if str(value) == text:
+                return value
+        elif name in INTERNED_ATTRIBUTES:
+            return sys.intern(text)
+    except ValueError:
+        pass
+    return text
+
+
+class CompactMessage:
+    """Immutable compact message, see the module description."""
+    __slots__ = ('_layout', '_values', 'timestamp', '_raw')
+
+    def __init__(self, layout: _Layout, values: tuple, timestamp: str, raw: bytes = None):
+        self._layout = layout
+        self._values = values
+        self.timestamp = timestamp
+        self._raw = raw
+
+    @classmethod
+    def from_message(cls, msg: Message) -> 'CompactMessage':
+        """Compact copy of the message."""
+        root = msg.xml_root
+        data = msg.data
+        if (len(data) or data.text or data.tail or root.text
+                or len(root) != 1 or any(name != 'Timestamp' for name in root.attrib)):
+            return cls(_layout(msg.tag, ()), (), msg.timestamp, msg.to_bytes())
+        attrib = data.attrib
+        layout = _layout(msg.tag, tuple(attrib))
+        values = tuple(_compact_value(name, text) for name, text in attrib.items())
+        return cls(layout, values, msg.timestamp)
+
+    def to_message(self) -> Message:
+        """Message equal to the one this was created from."""
+        if self._raw is not None:
+            return Message(ET.fromstring(self._raw))
+        root = ET.Element('Hermes')
+        if self.timestamp is not None:
+            root.set('Timestamp', self.timestamp)
+        ET.SubElement(root, self._layout.tag, self.attrib)
+        return Message(root)
+
+    @property
+    def tag(self) -> str:
+        """Tag of the data element."""
+        return self._layout.tag
+
+    @property
+    def data(self) -> 'CompactMessage':
+        """For code written for Message, data.get() and data.attrib return strings."""
+        if self._raw is not None:
+            return self.to_message().data
+        return self
+
+    @property
+    def attrib(self) -> dict:
+        """Attributes of the data element as strings."""
+        return {name: str(value) for name, value in zip(self._layout.names, self._values)}
+
+    def get(self, name: str, default=None):
+        """Attribute of the data element as string, like Element.get."""
+        if self._raw is not None:
+            return self.to_message().data.get(name, default)
+        position = self._layout.index.get(name)
+        if position is None:
+            return default
+        return str(self._values[position])
+
+    def value(self, name: str, default=None):
+        """Attribute of the data element, int or float for known numeric attributes."""
+        if self._raw is not None:
+            text = self.to_message().data.get(name)
+            return default if text is None else _compact_value(name, text)
+        position = self._layout.index.get(name)
+        return default if position is None else self._values[position]
+
+    def to_bytes(self) -> bytes:
+        """Serialized message, the original bytes if kept raw."""
+        if self._raw is not None:
+            return self._raw
+        return self.to_message().to_bytes()
+
+    def summary(self) -> str:
+        """Tag and attributes on one line, see Message.summary."""
+        if self._raw is not None:
+            return self.to_message().summary()
+        return summary_line(self.tag, self.attrib)
+
+    def __repr__(self):
+        return repr(self.to_message())
@@ -0,0 +1,315 @@
+"""Offline protocol conformance check of large IPC-Hermes-9852 traces.
+
+A Trace holds the messages of one connection as NumPy arrays: the tag id
+of each message, see state_machine.TAG_IDS, and whether the client sent
+it, the side of an UpstreamConnection, which connects and sends the first
+ServiceDescription. Both state machines of a connection take the same
+transitions, a message of the client follows UPSTREAM_TRANSITION_DICT,
+so the trace is the same whichever side captured it:
+
+    for trace in load_capture('session.hcap'):
+        for violation in check(trace):
+            print(violation)
+
+or from the command line: python -m ipc_hermes.conformance session.hcap
+
+Every message not allowed in its state is reported, the state is kept as
+a connection does for a protocol violation it sends. A captured connection
+without ServiceDescription is reported as Unchecked instead, its client is
+unknown. A captured message whose tag cannot be read is reported as Unparsed
+and checked as a message without transitions. The states are found with NumPy in chunks instead of one message
+at a time: each chunk is cut into blocks, the end state of each block is
+computed for every start state at once, and chaining these maps gives the
+state before each message.
+The maps also split a trace across a process pool, see check_parallel.
+Loading takes most of the time for capture files, check_captures loads
+each file once in a process of a pool and checks its connections in the pool.
+
+Requires numpy, which is optional for the rest of the package.
+"""
+
+import re
+import sys
+import math
+import argparse
+import collections
+import concurrent.futures
+
+try:
+    import numpy as np
+except ImportError:  # optional, only needed by this module
+    np = None
+
+from ipc_hermes.capture import CaptureReader, Direction
+from ipc_hermes.messages import Tag
+from ipc_hermes.state_machine import State, STATES, TAGS, TAG_IDS, ILLEGAL
+from ipc_hermes.state_machine import UPSTREAM_TABLE, DOWNSTREAM_TABLE
+
+CHUNK_SIZE = 1 << 20  # messages whose states are computed at a time
+SEGMENT_SIZE = 1 << 22  # messages per task of the process pool
+_TAG_PATTERN = re.compile(rb'\s*(?:<\?xml[^>]*\?>\s*)?<Hermes[^>]*>\s*<([A-Za-z_][A-Za-z0-9_.-]*)')
+UNPARSED_PREFIX = 40  # bytes of an Unparsed message reported
+
+Violation = collections.namedtuple('Violation', ['connection_id', 'index', 'tag', 'from_client', 'state'])
+# captured connection whose client is unknown, it has no ServiceDescription
+Unchecked = collections.namedtuple('Unchecked', ['connection_id', 'messages'])
+# captured message whose tag cannot be read, data is its beginning
+Unparsed = collections.namedtuple('Unparsed', ['connection_id', 'index', 'data'])
+
+_tables = None  # next state id and legality at event id * len(STATES) + state id, see _event_tables
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError("The conformance checker requires numpy, install it with: pip install numpy")
+
+
+def _event_tables() -> tuple:
+    """Flat tables by event id, the tag id plus len(TAGS) if the client sent the
+       message, and state id. A message not allowed keeps the state in the next state table.
+    """
+    global _tables  # pylint: disable=global-statement
+    if _tables is None:
+        rows = np.array(DOWNSTREAM_TABLE.rows + UPSTREAM_TABLE.rows, dtype=np.intp)
+        legal = rows != ILLEGAL
+        _tables = (np.where(legal, rows, np.arange(len(STATES))).ravel(), legal.ravel())
+    return _tables
+
+
+class Trace:
+    """Messages of one connection in order.
+
+    Args:
+        tag_ids (array): Tag id of each message, see state_machine.TAG_IDS.
+        from_client (array): True for each message sent by the client, the side of an
+            UpstreamConnection, which connects and sends MachineReady.
+        connection_id (int): Reported with the violations.
+    """
+    def __init__(self, tag_ids, from_client, connection_id: int = 0):
+        _require_numpy()
+        self.tag_ids = np.asarray(tag_ids, dtype=np.int16)
+        self.from_client = np.asarray(from_client, dtype=bool)
+        if self.tag_ids.shape != self.from_client.shape:
+            raise ValueError("tag_ids and from_client differ in length")
+        self.connection_id = connection_id
+
+    @classmethod
+    def from_messages(cls, messages, connection_id: int = 0) -> 'Trace':
+        """Trace of (tag, from_client) pairs."""
+        messages = list(messages)
+        return cls([TAG_IDS.get(tag, 0) for tag, _ in messages],
+                   [from_client for _, from_client in messages], connection_id)
+
+    def __len__(self) -> int:
+        return len(self.tag_ids)
+
+    def events(self):
+        """Event id of each message, the tag id plus len(TAGS) if the client sent it."""
+        return self.tag_ids + self.from_client * np.int16(len(TAGS))
+
+
+def load_capture(path: str, connection_id: int = None, unchecked: list = None) -> list:
+    """Traces of the connections in a capture file, optionally of one connection.
+       The client of a connection sends the first ServiceDescription. Connections
+       without it are not traced, an Unchecked of each is appended to unchecked.
+       An Unparsed of each message whose tag cannot be read is appended as well.
+    """
+    _require_numpy()
+    messages = {}  # connection id: [(tag id, sent)]
+    client_sent = {}  # connection id: True if the capturing side is the client
+    with CaptureReader(path) as reader:
+        for record in reader.messages(connection_id):
+            pairs = messages.setdefault(record.connection_id, [])
+            match = _TAG_PATTERN.match(record.data)
+            if match is None:
+                if unchecked is not None:
+                    unchecked.append(Unparsed(record.connection_id, len(pairs),
+                                              bytes(record.data[:UNPARSED_PREFIX])))
+                pairs.append((0, record.direction is Direction.SEND))
+                continue
+            tag = match.group(1).decode('ascii')
+            sent = record.direction is Direction.SEND
+            if tag == Tag.SERVICE_DESCRIPTION:
+                client_sent.setdefault(record.connection_id, sent)
+            pairs.append((TAG_IDS.get(tag, 0), sent))
+    traces = []
+    for conn_id, pairs in messages.items():
+        if conn_id not in client_sent:
+            if unchecked is not None:
+                unchecked.append(Unchecked(conn_id, len(pairs)))
+            continue
+        tag_ids, sent = zip(*pairs)
+        sent = np.array(sent, dtype=bool)
+        traces.append(Trace(tag_ids, sent if client_sent[conn_id] else ~sent, conn_id))
+    return traces
+
+
+def _blocks(events):
+    """Table offsets of the events as (block length, number of blocks),
+       padded with event 0 which keeps the state.
+    """
+    block = max(1, math.isqrt(len(events)))
+    count = -(-len(events) // block)
+    offsets = np.zeros(block * count, dtype=np.intp)
+    offsets[:len(events)] = events
+    offsets *= len(STATES)
+    return offsets.reshape(count, block).T.copy()
+
+
+def _block_maps(blocks):
+    """End state of each block for each start state, maps[block][start state id]."""
+    next_states, _ = _event_tables()
+    maps = np.tile(np.arange(len(STATES), dtype=np.intp), (blocks.shape[1], 1))
+    indexes = np.empty_like(maps)
+    for row in blocks:
+        np.add(maps, row[:, None], out=indexes)
+        np.take(next_states, indexes, out=maps)
+    return maps
+
+
+def _states_before(events, start: int) -> tuple:
+    """State id before each event and the state id after the last one."""
+    next_states, _ = _event_tables()
+    blocks = _blocks(events)
+    maps = _block_maps(blocks)
+    starts = np.empty(blocks.shape[1], dtype=np.intp)
+    state = start
+    for index, block_map in enumerate(maps):
+        starts[index] = state
+        state = block_map[state]
+    before = np.empty(blocks.shape, dtype=np.int8)
+    states = starts
+    for index, row in enumerate(blocks):
+        before[index] = states
+        states = next_states[row + states]
+    return before.T.ravel()[:len(events)], int(state)
+
+
+def _segment_map(events):
+    """End state of the events for each start state."""
+    state_map = np.arange(len(STATES), dtype=np.intp)
+    for offset in range(0, len(events), CHUNK_SIZE):
+        for block_map in _block_maps(_blocks(events[offset:offset + CHUNK_SIZE])):
+            state_map = block_map[state_map]
+    return state_map
+
+
+def _segment_violations(events, start: int) -> tuple:
+    """Positions and states of the events not allowed and the state after the last one."""
+    _, legal = _event_tables()
+    positions = []
+    states = []
+    state = start
+    for offset in range(0, len(events), CHUNK_SIZE):
+        chunk = events[offset:offset + CHUNK_SIZE]
+        before, state = _states_before(chunk, state)
+        illegal = np.flatnonzero(~legal[chunk * len(STATES) + before])
+        positions.append(illegal + offset)
+        states.append(before[illegal])
+    if not positions:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8), state
+    return np.concatenate(positions), np.concatenate(states), state
+
+
+def _violations(trace: Trace, positions, states) -> list:
+    return [Violation(trace.connection_id, int(index), TAGS[trace.tag_ids[index]] or 'Unknown',
+                      bool(trace.from_client[index]), STATES[state])
+            for index, state in zip(positions, states)]
+
+
+def check(trace: Trace, start: State = State.NOT_CONNECTED) -> list:
+    """Violations of the trace in order, empty if every message is allowed."""
+    _require_numpy()
+    positions, states, _ = _segment_violations(trace.events(), start.value)
+    return _violations(trace, positions, states)
+
+
+def check_parallel(traces: list, processes: int = None, segment_size: int = SEGMENT_SIZE) -> list:
+    """Violations of all traces, each starting NOT_CONNECTED, checked by a pool of
+       processes in segments of segment_size messages. The state maps of the segments
+       are computed first, to know the start state of each segment.
+    """
+    _require_numpy()
+    segments = []  # (trace index, offset, events)
+    for trace_index, trace in enumerate(traces):
+        events = trace.events()
+        for offset in range(0, len(events), segment_size):
+            segments.append((trace_index, offset, events[offset:offset + segment_size]))
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        maps = list(pool.map(_segment_map, [events for _, _, events in segments]))
+        starts = []
+        state = None
+        for (_, offset, _), state_map in zip(segments, maps):
+            if offset == 0:
+                state = State.NOT_CONNECTED.value
+            starts.append(state)
+            state = int(state_map[state])
+        results = pool.map(_segment_violations, [events for _, _, events in segments], starts)
+        violations = []
+        for (trace_index, offset, _), (positions, states, _) in zip(segments, results):
+            violations.extend(_violations(traces[trace_index], positions + offset, states))
+    return violations
+
+
+def _load_capture(path: str) -> tuple:
+    """Traces and the Unchecked connections and Unparsed messages of a capture file."""
+    unchecked = []
+    traces = load_capture(path, unchecked=unchecked)
+    return traces, unchecked
+
+
+def check_captures(paths: list, processes: int = None) -> dict:
+    """Violations of all connections in the capture files, an Unchecked for each
+       connection whose client is unknown and an Unparsed for each message whose
+       tag cannot be read, {path: [Violation, Unchecked or Unparsed]}.
+       Each file is loaded by a process of the pool, each of its connections
+       is checked by a process of the pool.
+    """
+    _require_numpy()
+    violations = {path: [] for path in paths}
+    with concurrent.futures.ProcessPoolExecutor(processes) as pool:
+        tasks = []  # (path, trace)
+        for path, (traces, unchecked) in zip(paths, pool.map(_load_capture, paths)):
+            violations[path].extend(unchecked)
+            tasks.extend((path, trace) for trace in traces)
+        results = pool.map(check, [trace for _, trace in tasks])
+        for (path, _), result in zip(tasks, results):
+            violations[path].extend(result)
+    return violations
+
+
+def main() -> None:
+    """Check capture files from the command line, the exit status is 1 on violations,
+       unchecked connections or unparsed messages.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("files", nargs='+', metavar="FILE", help="capture files")
+    parser.add_argument("--processes", type=int, help="size of the process pool, default number of CPUs")
+    args = parser.parse_args()
+
+    count = 0
+    unchecked = 0
+    unparsed = 0
+    for path, findings in check_captures(args.files, args.processes).items():
+        for finding in findings:
+            if isinstance(finding, Unparsed):
+                print(f"{path}: connection {finding.connection_id} message {finding.index}: "
+                      f"tag not readable, message starts with {finding.data!r}")
+                unparsed += 1
+                continue
+            if isinstance(finding, Unchecked):
+                print(f"{path}: connection {finding.connection_id}: {finding.messages} messages not checked, "
+                      "no ServiceDescription to tell which side connected")
+                unchecked += 1
+                continue
+            print(f"{path}: connection {finding.connection_id} message {finding.index}: "
+                  f"{finding.tag} sent by the "
+                  f"{'client (UpstreamConnection)' if finding.from_client else 'server (DownstreamConnection)'} "
+                  f"not allowed in {finding.state.name}")
+            count += 1
+    print(f"{count} violations, {unparsed} messages not parsed, {unchecked} connections not checked")
+    sys.exit(1 if count or unchecked or unparsed else 0)
+
+
+if __name__ == '__main__':
+    main()
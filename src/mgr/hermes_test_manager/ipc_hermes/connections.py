@@ -3,56 +3,100 @@
 
 import time
 import logging
+import itertools
 import threading
-import collections
 import socket
 import selectors
 import xml.etree.ElementTree as ET
-from datetime import datetime
 
-from ipc_hermes.messages import Message, Tag, NotificationCode, SeverityType
+from ipc_hermes.messages import Message, Tag, NotificationCode, SeverityType, parse_message
+from ipc_hermes.messages import LogFormat, LoggedMessage
+from ipc_hermes.framing import MessageFramer, StreamingParser
+from ipc_hermes.mailbox import Mailbox, OverflowPolicy
+from ipc_hermes.pacing import Pacing
+from ipc_hermes.latency import LatencyRecorder
+from ipc_hermes.capture import CaptureWriter, Direction
+from ipc_hermes.reactor import Reactor, Waker
 from ipc_hermes.state_machine import UpstreamStateMachine, DownstreamStateMachine
 
 SOCKET_TIMEOUT = 20.0
 RECEIVE_TIMEOUT = 20.0
-BUFFERSIZE = 4096
-ENDTAG = b"</Hermes>"
 
 if hasattr(selectors, 'PollSelector'):
     _ServerSelector = selectors.PollSelector
 else:
     _ServerSelector = selectors.SelectSelector
 
+_connection_ids = itertools.count(1)
+
 
 class ConnectionLost(Exception):
     """Socket connection lost or timed out"""
 
 
 class ClientServer:
-    """Base class for client and server."""
-    def __init__(self):
+    """Base class for client and server.
+
+    Args:
+        reactor (Reactor): Optional shared reactor to register the sockets with,
+            by default the connection starts its own receiving thread.
+    """
+    def __init__(self, reactor: Reactor = None):
         self._socket = None
         self._state_machine = None
-        self._pending_bytes = b''
-        self._deque = collections.deque()
+        self._framer = MessageFramer()
+        self._stream_parser = StreamingParser()
+        self._mailbox = Mailbox()
+        self._received = threading.Condition()
         self._log = logging.getLogger('ipc_hermes')
         self.__shutdown_request = False
         self.__is_shut_down = threading.Event()
         self._receive_thread = None
+        self._waker = None
         self._selector = _ServerSelector()
+        self._reactor = reactor
+        self._registered = set()
+        self._paused_socket = None
+        self._latency = None
+        self._reply_tracker = None
+        self._connection_id = next(_connection_ids)
         self._listener_exception = None
         self.strict_send_protocol = True
+        self.pacing: Pacing = None
+        self.streaming_receive = False
+        self.lazy_parse = True  # see messages.parse_message
+        self.log_format = LogFormat.SUMMARY  # of sent and received messages at INFO level
+        self.capture: CaptureWriter = None
 
     def connect(self, host:str, port:str|int) -> None:
         """Initiate the connection. To be overridden by subclasses."""
 
+    @property
+    def connection_id(self) -> int:
+        """Process-wide unique id of the connection, used in captures.
+           A downstream server gets a new id for each accepted client.
+        """
+        return self._connection_id
+
+    @property
+    def latency(self) -> LatencyRecorder:
+        """Recorder of the response latency of the other end, None to disable."""
+        return self._latency
+
+    @latency.setter
+    def latency(self, recorder:LatencyRecorder):
+        self._latency = recorder
+        self._reply_tracker = recorder.tracker() if recorder is not None else None
+
     def close(self) -> None:
         """Stop the receiving threads. Close the connection."""
         self._log.debug('Shutting down connection socket')
-        if self._receive_thread is not None:
-            self.__shutdown_request = True
-            self.__is_shut_down.wait()
+        self._stop_receiving()
+        self._log.debug('Mailbox high water mark: %s, dropped messages: %s',
+                        self._mailbox.high_water_mark, self._mailbox.dropped)
         self._selector.close()
+        if self._waker is not None:
+            self._waker.close()
         if self._socket is not None:
             self._socket.close()
             self._log.debug('Connection socket closed')
@@ -60,8 +104,9 @@ class ClientServer:
     def send_msg(self, msg:Message) -> int:
         """Send a message."""
         assert self._socket is not None, 'No connection established'
-        self._log.info('Try send: %s', str(msg))
-        return self._send_bytes(msg.tag, msg.to_bytes())
+        if self._log.isEnabledFor(logging.INFO):
+            self._log.info('Try send: %s', LoggedMessage(msg, self.log_format))
+        return self._send_bytes(msg.tag, msg.to_bytes(), msg)
 
     def send_tag_and_bytes(self, tag:Tag, msg_bytes:bytes) -> int:
         """Send a byte message to the downstream interface. 
@@ -70,41 +115,117 @@ class ClientServer:
         self._log.info('Try send %s bytes, "%s"', len(msg_bytes), tag)
         return self._send_bytes(tag, msg_bytes)
 
-    def _send_bytes(self, tag:Tag, msg_bytes:bytes) -> int:
-        """Send a byte message to the downstream interface."""
+    def _send_bytes(self, tag:Tag, msg_bytes:bytes, msg:Message=None) -> int:
+        """Send a byte message to the downstream interface.
+           Returns as soon as the bytes are handed to the socket unless
+           a pacing policy is set.
+        """
+        self._raise_on_listener_exception()
         self._state_machine.on_send_tag(tag, self.strict_send_protocol)
-        bytes_sent = self._socket.send(msg_bytes)
-        time.sleep(0.02)
-        if self._listener_exception is not None:
-            raise ConnectionLost('Listener exception', self._listener_exception)
+        if self.pacing is not None:
+            self.pacing.before_send()
+        if self._reply_tracker is not None:
+            self._reply_tracker.sent(tag, msg, time.perf_counter_ns())
+        sent_ns = time.monotonic_ns()
+        try:
+            bytes_sent = self._socket.send(msg_bytes)
+        except OSError as exc:
+            raise ConnectionLost('Send failed', exc) from exc
+        if self.capture is not None:
+            self.capture.record(self._connection_id, Direction.SEND, msg_bytes[:bytes_sent], sent_ns)
+        if self.pacing is not None:
+            self.pacing.after_send()
         return bytes_sent
 
-    def expect_message(self, tag, timeout_secs=RECEIVE_TIMEOUT) -> Message:
-        """Wait for a message with the given tag while ignoring other messages.
-           Assumes that another thread is inserting incomming messages into the deque.
+    def _raise_on_listener_exception(self) -> None:
+        """Report a failure of the receiving thread to the sending thread."""
+        if self._listener_exception is not None:
+            raise ConnectionLost('Listener exception', self._listener_exception) from self._listener_exception
+
+    def wait_for_disconnect(self, timeout_secs=SOCKET_TIMEOUT) -> bool:
+        """Wait until the other end has closed the connection or the listener failed.
+           Returns False if the connection is still open after timeout.
+        """
+        deadline = time.monotonic() + timeout_secs
+        with self._received:
+            while self._listener_exception is None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._received.wait(remaining)
+        return True
+
+    @property
+    def mailbox(self) -> Mailbox:
+        """Received messages not yet taken by expect_message.
+           Its max_retained and policy bound the memory used by unexpected messages.
+        """
+        return self._mailbox
+
+    def expect_message(self, tag, timeout_secs=RECEIVE_TIMEOUT, predicate=None) -> Message:
+        """Wait for a message with the given tag, optionally matching the predicate
+           e.g., match_attributes(BoardId=board_id).
+           Assumes that another thread is putting incomming messages into the mailbox
+           and notifying the _received condition. Each message is passed to the state
+           machine in arrival order. Other messages are kept for later calls.
+           A tag of None accepts any message.
         """
         self._log.debug('Wait for expected message: %s', tag)
-        start_time = datetime.now()
-        while True:
-            # if message is in queue, then return it
-            while len(self._deque):
-                msg = self._deque.popleft()
-                self._state_machine.on_recv(msg)
-                if msg.tag == tag:
-                    self._log.debug('Received expected message: %s', msg.tag)
-                    return msg
-            # queue is exhausted, so now wait for new/more messages
-            time.sleep(0.1)
-            now = datetime.now()
-            delta = now - start_time
-            if delta.total_seconds() > timeout_secs:
-                self._log.debug('Timed out after %ss waiting for message: %s', timeout_secs, tag)
-                raise ConnectionLost(f"Expected message <{tag}>, but timed out after {timeout_secs} seconds")
+        deadline = time.monotonic() + timeout_secs
+        with self._received:
+            while True:
+                msg = self._mailbox.take(tag, predicate)
+                if msg is not None:
+                    paused = self._paused_socket is not None
+                    break
+                observed = self._mailbox.observe()
+                if observed is not None:
+                    self._state_machine.on_recv(observed)
+                    continue
+                self._raise_on_listener_exception()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._log.debug('Timed out after %ss waiting for message: %s', timeout_secs, tag)
+                    raise ConnectionLost(f"Expected message <{tag}>, but timed out after {timeout_secs} seconds")
+                self._received.wait(remaining)
+        if paused:
+            self._resume_receiving()
+        self._log.debug('Received expected message: %s', msg.tag)
+        return msg
+
+    def _register(self, fileobj, callback) -> None:
+        """Call callback with the file object when it becomes readable,
+           either from the receiving thread or from the shared reactor.
+        """
+        if self._reactor is None:
+            self._selector.register(fileobj, selectors.EVENT_READ, callback)
+        else:
+            self._registered.add(fileobj)
+            self._reactor.register(fileobj, callback, self._on_reactor_error)
+
+    def _unregister(self, fileobj) -> None:
+        """Stop listening to the file object."""
+        if self._reactor is None:
+            self._selector.unregister(fileobj)
+        else:
+            self._registered.discard(fileobj)
+            self._reactor.unregister(fileobj)
+
+    def _on_reactor_error(self, exc:Exception) -> None:
+        """Like an IOError ending the listening loop, stop listening to all sockets."""
+        for fileobj in list(self._registered):
+            self._unregister(fileobj)
+        self._set_listener_exception(exc)
 
     def _start_receiving(self) -> None:
-        """Start the receiving thread."""
+        """Start the receiving thread, unless the shared reactor is used."""
+        if self._reactor is not None:
+            assert len(self._registered) > 0, 'No connection registered'
+            return
         assert len(self._selector.get_map()) > 0, 'No connection registered'
         assert self._receive_thread is None, 'Receiving thread already running'
+        self._waker = Waker()
+        self._selector.register(self._waker.reader, selectors.EVENT_READ, None)
         self._receive_thread = threading.Thread(target=self._listening_loop)
         self._receive_thread.daemon = True
         self._receive_thread.start()
@@ -118,34 +239,119 @@ class ClientServer:
         self.__is_shut_down.clear()
         try:
             while not self.__shutdown_request:
-                events = self._selector.select(0.5)
+                events = self._selector.select()
                 if self.__shutdown_request:
                     # shutdown() called during select(), exit immediately.
                     break
                 for key, _ in events:
                     callback = key.data
+                    if callback is None:
+                        # woken up by the waker
+                        self._waker.drain()
+                        self._resume_receiving()
+                        continue
                     callback(key.fileobj)
         except IOError as exc:
             self._log.debug('IOError in listening loop: %s', exc)
-            self._listener_exception = exc
+            self._set_listener_exception(exc)
         finally:
             self.__shutdown_request = False
             self.__is_shut_down.set()
             self._log.debug('Exiting listening loop')
 
+    def _stop_receiving(self) -> None:
+        """Stop listening to all sockets. The receiving thread is woken up
+           through the waker, so it exits immediately.
+        """
+        if self._reactor is not None:
+            for fileobj in list(self._registered):
+                self._unregister(fileobj)
+        elif self._receive_thread is not None:
+            self.__shutdown_request = True
+            self._waker.wake()
+            self.__is_shut_down.wait()
+            self._receive_thread = None
+
+    def _pause_receiving(self, sock:socket) -> None:
+        """Stop reading from the socket while the mailbox is full, so TCP flow control
+           holds back the sender. Called with the _received condition held.
+        """
+        self._log.debug('Mailbox full, pause receiving')
+        self._paused_socket = sock
+        self._unregister(sock)
+
+    def _resume_receiving(self) -> None:
+        """Read again from the paused socket once the mailbox has room.
+           Only the receiving thread changes its own selector, so other threads wake it up instead.
+        """
+        if self._reactor is None and threading.current_thread() is not self._receive_thread:
+            self._waker.wake()
+            return
+        with self._received:
+            sock = self._paused_socket
+            if sock is None or self._mailbox.full:
+                return
+            self._paused_socket = None
+        self._log.debug('Mailbox has room, resume receiving')
+        self._register(sock, self._handle_received_message)
+
+    def _set_listener_exception(self, exc:Exception) -> None:
+        """Store a listener failure and wake up any waiting thread."""
+        with self._received:
+            self._listener_exception = exc
+            self._received.notify_all()
+
     def _handle_received_message(self, sock:socket) -> None:
-        """Receive messages from the socket and put them in the servers deque."""
-        received = sock.recv(BUFFERSIZE)
-        self._pending_bytes += received
-        while True:
-            index = self._pending_bytes.find(ENDTAG)
-            if index == -1:
-                break
-            splitat = index + len(ENDTAG)
-            msg_bytes, self._pending_bytes = self._pending_bytes[:splitat], self._pending_bytes[splitat:0]
-            msg = Message(ET.fromstring(msg_bytes))
-            self._log.info('Received: %s', msg)
-            self._deque.append(msg)
+        """Receive messages from the socket and put them in the mailbox.
+           A full mailbox pauses receiving or raises MailboxOverflow, depending on its policy.
+           With streaming_receive set, messages are parsed while bytes arrive
+           instead of after the complete frame has been received.
+           With lazy_parse set, simple frames are scanned and their elements are
+           only built when accessed, see messages.parse_message.
+        """
+        tap = self._capture_received if self.capture is not None else None
+        try:
+            if self.streaming_receive:
+                received = self._stream_parser.receive(sock, tap)
+                messages = [Message(root) for root in self._stream_parser.roots()]
+            else:
+                received = self._framer.receive(sock, tap)
+                messages = self._parse_frames()
+        except ConnectionResetError as exc:
+            self._connection_closed(sock, ConnectionLost('Connection reset by peer', exc))
+            return
+        if not received:
+            self._connection_closed(sock, ConnectionLost('Connection closed by peer'))
+            return
+        received_ns = time.perf_counter_ns()
+        log_received = self._log.isEnabledFor(logging.INFO)
+        for msg in messages:
+            if log_received:
+                self._log.info('Received: %s', LoggedMessage(msg, self.log_format))
+            if self._reply_tracker is not None:
+                self._reply_tracker.received(msg.tag, msg, received_ns)
+            with self._received:
+                self._mailbox.put(msg)
+                self._received.notify_all()
+        with self._received:
+            if self._mailbox.full and self._mailbox.policy is OverflowPolicy.BLOCK:
+                self._pause_receiving(sock)
+
+    def _capture_received(self, data:memoryview) -> None:
+        """Record received bytes before they are parsed."""
+        self.capture.record(self._connection_id, Direction.RECV, data)
+
+    def _connection_closed(self, sock:socket, exc:ConnectionLost) -> None:
+        """The other end closed the connection, stop listening to its socket."""
+        self._log.debug('%s', exc.args[0])
+        self._unregister(sock)
+        self._set_listener_exception(exc)
+
+    def _parse_frames(self):
+        """Parse all complete frames received so far."""
+        for frame in self._framer.frames():
+            with frame:
+                yield parse_message(frame) if self.lazy_parse else Message(ET.fromstring(frame))
 
 
 class UpstreamConnection(ClientServer):
@@ -167,6 +373,7 @@ class UpstreamConnection(ClientServer):
                     continue
                 try:
                     new_socket.settimeout(SOCKET_TIMEOUT)
+                    new_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
                     new_socket.connect(sockaddr)
                     break
                 except OSError as exc:
@@ -187,7 +394,7 @@ class UpstreamConnection(ClientServer):
 
     def start_receiving(self) -> None:
         """Start the receiving thread."""
-        self._selector.register(self._socket, selectors.EVENT_READ, self._handle_received_message)
+        self._register(self._socket, self._handle_received_message)
         super()._start_receiving()
 
 
@@ -195,10 +402,12 @@ class DownstreamConnection(ClientServer):
     """Creating a downstream server to allow multiple async connections
        from upstream IPC-Hermes-9852 clients. Only one will be allowed though.
     """
-    def __init__(self):
+    def __init__(self, reactor: Reactor = None):
         self._server_socket = None
         self._client_address = None
-        super().__init__()
+        self._client_connected = False
+        self._connection_count = 0
+        super().__init__(reactor)
 
     def connect(self, host:str, port:str|int) -> None:
         """Start the downstream server. Get ready to accept connections
@@ -214,39 +423,69 @@ class DownstreamConnection(ClientServer):
         self._log.debug('Server listening')
 
         self._server_socket.setblocking(False)
-        self._selector.register(self._server_socket, selectors.EVENT_READ, self._handle_accept)
+        self._register(self._server_socket, self._handle_accept)
         self._state_machine = DownstreamStateMachine()
         super()._start_receiving()
         self._log.debug('Downstream server successfully started')
 
-    def wait_for_connection(self, timeout_secs=SOCKET_TIMEOUT) -> str:
-        """Wait for a connection to the downstream server.
-           _socket will be set from listening thread and handle_accept.
+    @property
+    def connection_count(self) -> int:
+        """Number of upstream clients accepted since the server was started."""
+        return self._connection_count
+
+    def wait_for_connection(self, timeout_secs=SOCKET_TIMEOUT, connection_number:int=None) -> str:
+        """Wait for a connection to the downstream server and return the client address.
+           The listening thread signals each accepted client from _handle_accept.
+           Args:
+                connection_number (int) default None, wait for a connected client.
+                    Otherwise wait for the Nth client accepted since the server was started,
+                    e.g., to follow a client reconnecting over and over again.
         """
         self._log.debug('Waiting for upstream client to connect')
-        start_time = datetime.now()
-        while self._socket is None:
-            now = datetime.now()
-            delta = now - start_time
-            if delta.total_seconds() > timeout_secs:
+        def connected() -> bool:
+            if connection_number is None:
+                return self._client_connected
+            return self._connection_count >= connection_number
+
+        start_time = time.monotonic()
+        with self._received:
+            if not self._received.wait_for(connected, timeout_secs):
                 self._log.debug('Timeout waiting for upstream client')
                 raise ConnectionLost(f"Upstream client did not connect within {timeout_secs} seconds")
-            time.sleep(0.1)
-        self._log.debug('Upstream client connected after %s seconds', delta.total_seconds())
-        return str(self._client_address)
-
+            client_address = self._client_address
+        self._log.debug('Upstream client connected after %s seconds', time.monotonic() - start_time)
+        return str(client_address)
 
     def _handle_accept(self, sock:socket) -> None:
         """The IPC-Hermes-9852 protocol only allows one client.
            So, accept the first and deny all others by sending a Notificaion.
+           A new client is accepted once the previous one has closed its connection.
         """
         request, client_address = sock.accept()
         self._log.debug('Verifying a connection request: %s', client_address)
 
-        if self._socket is None:
+        if not self._client_connected:
+            if self._socket is not None:
+                self._log.debug('Replacing closed upstream socket')
+                self._socket.close()
+                self._framer.reset()
+                self._stream_parser.reset()
+                self._state_machine = DownstreamStateMachine()
+                if self._reply_tracker is not None:
+                    self._reply_tracker.reset()
+                self._connection_id = next(_connection_ids)
+                with self._received:
+                    # messages of the previous session would confuse the new state machine
+                    self._mailbox.clear()
+            request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self._socket = request
-            self._selector.register(self._socket, selectors.EVENT_READ, self._handle_received_message)
-            self._client_address = client_address
+            self._register(self._socket, self._handle_received_message)
+            with self._received:
+                self._client_address = client_address
+                self._client_connected = True
+                self._connection_count += 1
+                self._listener_exception = None
+                self._received.notify_all()
             self._log.debug('Upstream socket created')
             return
 
@@ -260,10 +499,16 @@ class DownstreamConnection(ClientServer):
         finally:
             request.close()
 
+    def _connection_closed(self, sock:socket, exc:ConnectionLost) -> None:
+        """The upstream client closed the connection, allow the next one to connect."""
+        with self._received:
+            self._client_connected = False
+        super()._connection_closed(sock, exc)
+
     def close(self) -> None:
         """Stop accepting connections and close the server socket."""
         self._log.debug('Shutting down downstream server socket')
-        self._selector.unregister(self._server_socket)
+        self._stop_receiving()
         if self._server_socket is not None:
             self._server_socket.close()
             self._log.debug('Server socket closed')
@@ -0,0 +1,219 @@
+"""Splitting the received IPC-Hermes-9852 byte stream into message frames."""
+
+import re
+import xml.etree.ElementTree as ET
+
+from ipc_hermes.messages import MAX_MESSAGE_SIZE
+
+ENDTAG = b"</Hermes>"
+BUFFERSIZE = 4096
+_WHITESPACE = b" \t\r\n"
+_ENDTAG_PATTERN = re.compile(re.escape(ENDTAG))
+
+
+class MessageTooLarge(IOError):
+    """Received message exceeds the maximum message size"""
+
+
+class MessageFramer:
+    """Incremental framer backed by a reusable bytearray.
+
+       Bytes are received directly into the buffer and each byte is scanned
+       for the end tag only once, so the cost is linear in the number of
+       bytes received regardless of how a message is split into packets.
+       Bytes following a frame boundary are kept for the next frame.
+
+    Args:
+        recv_size (int): Maximum number of bytes read per receive call.
+        capacity (int): Initial buffer size, grows when needed.
+        max_size (int): Frames larger than this raise MessageTooLarge.
+    """
+    def __init__(self, recv_size: int = BUFFERSIZE, capacity: int = 4 * BUFFERSIZE,
+                 max_size: int = MAX_MESSAGE_SIZE):
+        self._recv_size = recv_size
+        self._max_size = max_size
+        self._buffer = bytearray(max(capacity, recv_size))
+        self._view = memoryview(self._buffer)
+        self._start = 0  # first byte of the pending frame
+        self._end = 0    # end of received bytes
+        self._scan = 0   # where the next search for the end tag starts
+
+    @property
+    def pending(self) -> int:
+        """Number of received bytes not yet returned as a frame."""
+        return self._end - self._start
+
+    def receive(self, sock, tap=None) -> int:
+        """Receive bytes from the socket into the buffer.
+           Returns the number of bytes received, zero if the peer closed the connection.
+           tap is an optional function called with a memoryview of the received bytes.
+        """
+        view = self.get_buffer()
+        count = sock.recv_into(view)
+        if tap is not None and count:
+            with view[:count] as received:
+                tap(received)
+        self.buffer_updated(count)
+        return count
+
+    def get_buffer(self) -> memoryview:
+        """Return a writable view to receive bytes into, see buffer_updated().
+           Same protocol as asyncio.BufferedProtocol.
+        """
+        self._reserve(self._recv_size)
+        return self._view[self._end:self._end + self._recv_size]
+
+    def buffer_updated(self, count: int) -> None:
+        """Register count bytes written into the view returned by get_buffer()."""
+        self._end += count
+
+    def feed(self, data) -> None:
+        """Append bytes from a bytes-like object e.g., when not reading from a socket."""
+        size = len(data)
+        self._reserve(size)
+        self._view[self._end:self._end + size] = data
+        self._end += size
+
+    def frames(self):
+        """Yield a memoryview for each complete frame in the buffer.
+           A view is only valid until the next call to receive() or feed(),
+           so it should be parsed (or copied) and released right away.
+        """
+        view = self._view
+        end = self._end
+        max_size = self._max_size
+        start = self._start
+        index = self._buffer.find(ENDTAG, self._scan, end)
+        try:
+            if index != -1:
+                splitat = index + len(ENDTAG)
+                if splitat - start > max_size:
+                    raise MessageTooLarge(f"Message of {splitat - start} bytes exceeds {max_size} bytes")
+                frame = view[start:splitat]
+                start = splitat
+                yield frame
+                # further frames of one receive are small, a single scanner
+                # finds them with less overhead than a find call for each
+                for match in _ENDTAG_PATTERN.finditer(self._buffer, start, end):
+                    splitat = match.end()
+                    if splitat - start > max_size:
+                        raise MessageTooLarge(f"Message of {splitat - start} bytes exceeds {max_size} bytes")
+                    frame = view[start:splitat]
+                    start = splitat
+                    yield frame
+        finally:
+            # also when the caller stops early, the frames yielded are consumed
+            self._start = self._scan = start
+        # an end tag may be split between two packets, rescan its head only
+        self._scan = max(start, end - len(ENDTAG) + 1)
+        if end - start > max_size:
+            raise MessageTooLarge(f"No end tag within {max_size} bytes")
+        if start == end:
+            self._start = self._end = self._scan = 0
+
+    def reset(self) -> None:
+        """Discard all pending bytes e.g., when a new connection is established."""
+        self._start = self._end = self._scan = 0
+
+    def _reserve(self, size: int) -> None:
+        """Make room for size more bytes at the end of the buffer."""
+        if self._end + size <= len(self._buffer):
+            return
+        pending = self._end - self._start
+        if pending + size <= len(self._buffer) // 2:
+            # plenty of room once consumed frames are dropped, move pending bytes to front
+            self._buffer[:pending] = self._buffer[self._start:self._end]
+        else:
+            # frames still referencing the old buffer keep it alive until released
+            buffer = bytearray(max(2 * len(self._buffer), pending + size))
+            buffer[:pending] = self._view[self._start:self._end]
+            self._buffer = buffer
+            self._view = memoryview(buffer)
+        self._scan -= self._start
+        self._start = 0
+        self._end = pending
+
+
+class StreamingParser:
+    """Incremental parser feeding received bytes to an XML parser as they arrive.
+
+       Each message gets its own expat based parser, which is closed as soon
+       as the end tag has been fed. Received bytes are passed on as memoryviews,
+       so a frame is never copied into a bytes object of its own. A message
+       growing beyond max_size is rejected before the rest of it is received.
+
+    Args:
+        recv_size (int): Maximum number of bytes read per receive call.
+        max_size (int): Messages larger than this raise MessageTooLarge.
+    """
+    def __init__(self, recv_size: int = BUFFERSIZE, max_size: int = MAX_MESSAGE_SIZE):
+        self._max_size = max_size
+        self._buffer = bytearray(recv_size)
+        self._view = memoryview(self._buffer)
+        self._parser = None
+        self._frame_size = 0
+        self._carry = b''  # last bytes fed, may hold the head of a split end tag
+        self._roots = []
+
+    def receive(self, sock, tap=None) -> int:
+        """Receive bytes from the socket and parse them.
+           Returns the number of bytes received, zero if the peer closed the connection.
+           tap is an optional function called with a memoryview of the received bytes.
+        """
+        count = sock.recv_into(self._view)
+        if tap is not None and count:
+            with self._view[:count] as received:
+                tap(received)
+        self._feed(self._buffer, self._view, 0, count)
+        return count
+
+    def feed(self, data) -> None:
+        """Parse bytes from a bytes-like object e.g., when not reading from a socket."""
+        data = bytes(data) if not isinstance(data, (bytes, bytearray)) else data
+        self._feed(data, memoryview(data), 0, len(data))
+
+    def roots(self) -> list:
+        """Return the root elements of all messages completed since the last call."""
+        roots, self._roots = self._roots, []
+        return roots
+
+    def reset(self) -> None:
+        """Discard a partially received message e.g., when a new connection is established."""
+        self._parser = None
+        self._carry = b''
+        self._roots = []
+
+    def _feed(self, data, view: memoryview, start: int, end: int) -> None:
+        """Feed data[start:end] split at end tags to the per message parsers."""
+        while start < end:
+            if self._parser is None:
+                while start < end and data[start] in _WHITESPACE:
+                    start += 1
+                if start == end:
+                    return
+                self._parser = ET.XMLParser()
+                self._frame_size = 0
+                self._carry = b''
+            splitat = self._find_end(data, start, end)
+            stop = end if splitat == -1 else splitat
+            self._frame_size += stop - start
+            if self._frame_size > self._max_size:
+                self.reset()
+                raise MessageTooLarge(f"Message exceeds {self._max_size} bytes")
+            self._parser.feed(view[start:stop])
+            if splitat == -1:
+                self._carry = (self._carry + data[max(start, end + 1 - len(ENDTAG)):end])[1 - len(ENDTAG):]
+                return
+            self._roots.append(self._parser.close())
+            self._parser = None
+            start = splitat
+
+    def _find_end(self, data, start: int, end: int) -> int:
+        """Return the index just after the end tag in data, -1 if not found."""
+        if self._carry:
+            joined = self._carry + data[start:min(start + len(ENDTAG) - 1, end)]
+            index = joined.find(ENDTAG)
+            if index != -1:
+                return start + index + len(ENDTAG) - len(self._carry)
+        index = data.find(ENDTAG, start, end)
+        return -1 if index == -1 else index + len(ENDTAG)
@@ -0,0 +1,244 @@
+"""Response latency of the other end of IPC-Hermes-9852 connections.
+
+Sent requests are paired with received replies by tag and, where the
+messages carry it, BoardId. The time between them is recorded in a
+histogram per (request tag, reply tag) pair:
+
+    recorder = LatencyRecorder()
+    connection.latency = recorder
+    ...
+    print(recorder.histogram(Tag.TRANSPORT_FINISHED, Tag.STOP_TRANSPORT))
+
+Histograms use logarithmic buckets, so they stay small regardless of the
+number of samples and can be merged across connections and test runs.
+"""
+
+import math
+import threading
+
+from ipc_hermes.messages import Tag
+
+SUB_BUCKET_BITS = 3  # 8 buckets per power of two, at most 12.5% relative error
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+# (request tag, reply tag, attribute both messages must agree on or None)
+REPLY_PAIRS = (
+    (Tag.SERVICE_DESCRIPTION, Tag.SERVICE_DESCRIPTION, None),
+    (Tag.BOARD_AVAILABLE, Tag.MACHINE_READY, None),
+    (Tag.BOARD_AVAILABLE, Tag.START_TRANSPORT, 'BoardId'),
+    (Tag.TRANSPORT_FINISHED, Tag.STOP_TRANSPORT, 'BoardId'),
+    (Tag.MACHINE_READY, Tag.BOARD_AVAILABLE, None),
+    (Tag.START_TRANSPORT, Tag.TRANSPORT_FINISHED, 'BoardId'),
+    (Tag.QUERY_BOARD_INFO, Tag.SEND_BOARD_INFO, None),
+    (Tag.GET_CONFIGURATION, Tag.CURRENT_CONFIGURATION, None),
+)
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram of latencies in nanoseconds."""
+    def __init__(self):
+        self.counts = {}  # bucket index: number of samples
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+
+    @staticmethod
+    def bucket(value_ns: int) -> int:
+        """Index of the bucket holding the value."""
+        if value_ns < _SUB_BUCKETS:
+            return max(value_ns, 0)
+        shift = value_ns.bit_length() - SUB_BUCKET_BITS - 1
+        return ((shift + 1) << SUB_BUCKET_BITS) | ((value_ns >> shift) & (_SUB_BUCKETS - 1))
+
+    @staticmethod
+    def bucket_bounds(index: int) -> tuple:
+        """Lowest value and one past the highest value of the bucket."""
+        if index < _SUB_BUCKETS:
+            return (index, index + 1)
+        shift = (index >> SUB_BUCKET_BITS) - 1
+        mantissa = _SUB_BUCKETS | (index & (_SUB_BUCKETS - 1))
+        return (mantissa << shift, (mantissa + 1) << shift)
+
+    def record(self, value_ns: int) -> None:
+        """Add a sample."""
+        index = self.bucket(value_ns)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_ns += value_ns
+        if self.min_ns is None or value_ns < self.min_ns:
+            self.min_ns = value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """Add all samples of the other histogram."""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total_ns += other.total_ns
+        if other.min_ns is not None and (self.min_ns is None or other.min_ns < self.min_ns):
+            self.min_ns = other.min_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    @property
+    def mean_ns(self) -> float:
+        """Average latency, 0.0 without samples."""
+        return self.total_ns / self.count if self.count else 0.0
+
+    def percentile(self, percent: float) -> int:
+        """Latency below which the given percentage of samples fall, as the upper
+           bound of its bucket but not above the largest sample. 0 without samples.
+        """
+        if not self.count:
+            return 0
+        rank = min(max(1, math.ceil(self.count * percent / 100)), self.count)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self.bucket_bounds(index)[1] - 1, self.max_ns)
+        return self.max_ns
+
+    def to_dict(self) -> dict:
+        """JSON compatible representation, e.g. to merge results of separate runs."""
+        return {'counts': {str(index): count for index, count in sorted(self.counts.items())},
+                'count': self.count,
+                'total_ns': self.total_ns,
+                'min_ns': self.min_ns,
+                'max_ns': self.max_ns}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LatencyHistogram':
+        """Inverse of to_dict."""
+        self = cls()
+        self.counts = {int(index): count for index, count in data['counts'].items()}
+        self.count = data['count']
+        self.total_ns = data['total_ns']
+        self.min_ns = data['min_ns']
+        self.max_ns = data['max_ns']
+        return self
+
+    def __str__(self):
+        if not self.count:
+            return "no samples"
+        return (f"n={self.count} min={self.min_ns / 1e6:.3f}ms mean={self.mean_ns / 1e6:.3f}ms "
+                f"p50={self.percentile(50) / 1e6:.3f}ms p99={self.percentile(99) / 1e6:.3f}ms "
+                f"max={self.max_ns / 1e6:.3f}ms")
+
+
+class LatencyRecorder:
+    """Histograms per (request tag, reply tag) pair, shared by any number of connections.
+       Thread-safe.
+    """
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def tracker(self) -> 'ReplyTracker':
+        """New tracker pairing the messages of one connection."""
+        return ReplyTracker(self)
+
+    def record(self, request_tag: str, reply_tag: str, latency_ns: int) -> None:
+        """Add a sample to the histogram of the pair."""
+        with self._lock:
+            histogram = self._histograms.get((request_tag, reply_tag))
+            if histogram is None:
+                histogram = self._histograms[(request_tag, reply_tag)] = LatencyHistogram()
+            histogram.record(latency_ns)
+
+    def histogram(self, request_tag: str, reply_tag: str) -> LatencyHistogram:
+        """Copy of the histogram of the pair, empty if nothing was recorded."""
+        copy = LatencyHistogram()
+        with self._lock:
+            histogram = self._histograms.get((request_tag, reply_tag))
+            if histogram is not None:
+                copy.merge(histogram)
+        return copy
+
+    def histograms(self) -> dict:
+        """Copies of all histograms, {(request tag, reply tag): LatencyHistogram}."""
+        with self._lock:
+            pairs = list(self._histograms)
+        return {pair: self.histogram(*pair) for pair in pairs}
+
+    def merge(self, other: 'LatencyRecorder') -> None:
+        """Add all samples of the other recorder."""
+        for (request_tag, reply_tag), other_histogram in other.histograms().items():
+            with self._lock:
+                histogram = self._histograms.get((request_tag, reply_tag))
+                if histogram is None:
+                    histogram = self._histograms[(request_tag, reply_tag)] = LatencyHistogram()
+                histogram.merge(other_histogram)
+
+    def reset(self) -> None:
+        """Remove all samples."""
+        with self._lock:
+            self._histograms.clear()
+
+    def to_dict(self) -> dict:
+        """JSON compatible representation, keys are "request->reply"."""
+        return {f"{request_tag}->{reply_tag}": histogram.to_dict()
+                for (request_tag, reply_tag), histogram in self.histograms().items()}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'LatencyRecorder':
+        """Inverse of to_dict."""
+        self = cls()
+        for pair, histogram in data.items():
+            request_tag, _, reply_tag = pair.partition('->')
+            self._histograms[(request_tag, reply_tag)] = LatencyHistogram.from_dict(histogram)
+        return self
+
+    def __str__(self):
+        return "\n".join(f"{request_tag} -> {reply_tag}: {histogram}"
+                         for (request_tag, reply_tag), histogram in sorted(self.histograms().items()))
+
+
+class ReplyTracker:
+    """Pairs requests sent on one connection with the replies received on it.
+       Only the first request is kept until its reply arrives. A request sent
+       after its reply, e.g. BoardAvailable after MachineReady, is not a request.
+       Sending and receiving may happen on different threads.
+    """
+    def __init__(self, recorder: LatencyRecorder):
+        self._recorder = recorder
+        self._pending = {}  # (request tag, reply tag, key value): send time
+        self._answered = set()  # (request tag, reply tag, key value) received before the request
+        self._lock = threading.Lock()
+
+    def sent(self, tag: str, msg, time_ns: int) -> None:
+        """Register a sent message, msg is the Message or None if unknown.
+           Attributes are only read for pairs agreeing on one.
+        """
+        with self._lock:
+            for request_tag, reply_tag, key in REPLY_PAIRS:
+                if request_tag == tag:
+                    value = msg.get(key) if key is not None and msg is not None else None
+                    pair = (request_tag, reply_tag, value)
+                    if pair in self._answered:
+                        self._answered.discard(pair)
+                    else:
+                        self._pending.setdefault(pair, time_ns)
+
+    def received(self, tag: str, msg, time_ns: int) -> None:
+        """Register a received message and record the latency of the requests it answers."""
+        samples = []
+        with self._lock:
+            for request_tag, reply_tag, key in REPLY_PAIRS:
+                if reply_tag == tag:
+                    value = msg.get(key) if key is not None else None
+                    pair = (request_tag, reply_tag, value)
+                    sent_ns = self._pending.pop(pair, None)
+                    if sent_ns is not None:
+                        samples.append((request_tag, time_ns - sent_ns))
+                    else:
+                        self._answered.add(pair)
+        for request_tag, latency_ns in samples:
+            self._recorder.record(request_tag, tag, latency_ns)
+
+    def reset(self) -> None:
+        """Forget pending requests, e.g. when a new session starts."""
+        with self._lock:
+            self._pending.clear()
+            self._answered.clear()
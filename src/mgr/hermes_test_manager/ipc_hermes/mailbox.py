@@ -0,0 +1,162 @@
+"""Receive mailbox for IPC-Hermes-9852 connections."""
+
+import logging
+import collections
+from enum import Enum
+from enum import unique
+
+DEFAULT_RETENTION = 10000
+
+
+@unique
+class OverflowPolicy(Enum):
+    """What to do with a received message when the mailbox is full."""
+    BLOCK = 0  # stop reading from the socket until messages are taken
+    DROP_OLDEST = 1  # discard the oldest retained message
+    FAIL = 2  # raise MailboxOverflow, the connection reports it as lost
+
+
+class MailboxOverflow(IOError):
+    """Received message does not fit in the mailbox"""
+
+
+def match_attributes(**attributes):
+    """Return a predicate matching messages with all the given attribute values
+       in their data element e.g., match_attributes(BoardId=board_id).
+    """
+    expected = [(name, str(value)) for name, value in attributes.items()]
+
+    def predicate(msg) -> bool:
+        return all(msg.get(name) == value for name, value in expected)
+    return predicate
+
+
+class Mailbox:
+    """Received messages indexed by tag.
+
+       Messages stay in the mailbox until taken, so a message arriving before
+       it is expected is not lost. Each tag has its own queue, so finding the
+       oldest message with a tag does not depend on other traffic.
+       Besides, messages are observed one by one in arrival order, which lets
+       the connection run its state machine in the order messages were received.
+       Only observed messages can be taken.
+
+       Not thread-safe, the connection serializes access.
+
+    Args:
+        max_retained (int): Maximum number of messages kept.
+        policy (OverflowPolicy): Handling of messages beyond max_retained.
+            With BLOCK the mailbox accepts them, the connection stops reading
+            while the mailbox is full, so it may exceed the bound by the
+            messages of a single receive call.
+    """
+    def __init__(self, max_retained: int = DEFAULT_RETENTION,
+                 policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST):
+        self.max_retained = max_retained
+        self.policy = policy
+        self.dropped = 0
+        self.high_water_mark = 0
+        self._queues = {}  # tag: deque of (seq, msg) in arrival order
+        self._unobserved = collections.deque()
+        self._observed_seq = 0
+        self._seq = 0
+        self._count = 0
+        self._log = logging.getLogger('ipc_hermes')
+
+    def __len__(self) -> int:
+        """Number of retained messages."""
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        """True if no more messages fit within the bound."""
+        return self._count >= self.max_retained
+
+    def put(self, msg) -> None:
+        """Add a received message, applying the overflow policy if the mailbox is full."""
+        if self.full and self.policy is OverflowPolicy.FAIL:
+            self.dropped += 1
+            raise MailboxOverflow(f"Mailbox full, {self._count} messages not taken, received: {msg.tag}")
+        self._seq += 1
+        entry = (self._seq, msg)
+        queue = self._queues.get(msg.tag)
+        if queue is None:
+            queue = self._queues[msg.tag] = collections.deque()
+        queue.append(entry)
+        self._unobserved.append(entry)
+        self._count += 1
+        if self.policy is OverflowPolicy.DROP_OLDEST:
+            while self._count > self.max_retained:
+                self._drop_oldest()
+        self.high_water_mark = max(self.high_water_mark, self._count)
+
+    def observe(self):
+        """Return the next message in arrival order not yet observed, None if there is none.
+           The message stays in the mailbox until taken.
+        """
+        if not self._unobserved:
+            return None
+        seq, msg = self._unobserved.popleft()
+        self._observed_seq = seq
+        return msg
+
+    def take(self, tag, predicate=None):
+        """Remove and return the oldest observed message with the tag for which
+           the optional predicate is true, None if there is none.
+           A tag of None matches messages with any tag.
+        """
+        if tag is None:
+            return self._take_oldest(predicate)
+        queue = self._queues.get(tag)
+        if not queue:
+            return None
+        for index, (seq, msg) in enumerate(queue):
+            if seq > self._observed_seq:
+                return None
+            if predicate is None or predicate(msg):
+                return self._remove(tag, index)
+        return None
+
+    def clear(self) -> None:
+        """Remove all messages."""
+        self._queues.clear()
+        self._unobserved.clear()
+        self._observed_seq = self._seq
+        self._count = 0
+
+    def _take_oldest(self, predicate):
+        """Remove and return the oldest observed message of any tag matching the predicate."""
+        oldest = None
+        for tag, queue in self._queues.items():
+            for index, (seq, msg) in enumerate(queue):
+                if seq > self._observed_seq:
+                    break
+                if predicate is None or predicate(msg):
+                    if oldest is None or seq < oldest[0]:
+                        oldest = (seq, tag, index)
+                    break
+        if oldest is None:
+            return None
+        return self._remove(oldest[1], oldest[2])
+
+    def _remove(self, tag, index: int):
+        """Remove and return the message at the index of the queue of the tag."""
+        queue = self._queues[tag]
+        _, msg = queue[index]
+        del queue[index]
+        self._count -= 1
+        if not queue:
+            del self._queues[tag]
+        return msg
+
+    def _drop_oldest(self) -> None:
+        """Drop the oldest retained message to stay within the retention bound."""
+        tag, queue = min(self._queues.items(), key=lambda item: item[1][0][0])
+        seq, msg = queue.popleft()
+        if not queue:
+            del self._queues[tag]
+        if self._unobserved and self._unobserved[0][0] == seq:
+            self._unobserved.popleft()
+        self._count -= 1
+        self.dropped += 1
+        self._log.debug('Mailbox full, dropped oldest message: %s', msg.tag)
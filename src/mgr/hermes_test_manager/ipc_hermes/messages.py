@@ -1,8 +1,9 @@
 """IPC-Hermes-9852 message definitions."""
 
+import re
 import xml.etree.ElementTree as ET
 from datetime import datetime
-from enum import IntEnum
+from enum import Enum, IntEnum, unique
 
 MAX_MESSAGE_SIZE = 65536
 
@@ -94,11 +95,19 @@ class Message:
         return self._data.tag
 
     def __repr__(self):
-        xml_string = ET.tostring(self._root, encoding="unicode") # only unicode encoding returns a string
+        xml_string = ET.tostring(self.xml_root, encoding="unicode") # only unicode encoding returns a string
         return ET.canonicalize(xml_string, strip_text=True)
 
+    def get(self, name, default=None):
+        """Attribute of the data element, like data.get."""
+        return self.data.get(name, default)
+
+    def summary(self) -> str:
+        """Tag and data element attributes on one line, cheaper than repr."""
+        return summary_line(self.tag, self.data.attrib)
+
     def to_bytes(self):
-        retval = ET.tostring(self._root) # returns bytes
+        retval = ET.tostring(self.xml_root) # returns bytes
         return retval
 
     @classmethod
@@ -284,4 +293,130 @@ class Message:
 
     def set(self, name, value):
         if value is not None:
-            self._data.set(name, str(value))
+            self.data.set(name, str(value))
+
+
+def summary_line(tag: str, attrib: dict) -> str:
+    """One line log format of a message, e.g. StartTransport BoardId="..." """
+    return ' '.join([tag] + [f'{name}="{value}"' for name, value in attrib.items()])
+
+
+@unique
+class LogFormat(Enum):
+    """How connections log sent and received messages."""
+    SUMMARY = 0  # tag and data element attributes, see Message.summary
+    XML = 1  # canonical XML, as repr(msg)
+
+
+class LoggedMessage:
+    """Log argument formatting a message only when a handler emits the record:
+
+        log.info('Received: %s', LoggedMessage(msg, LogFormat.SUMMARY))
+    """
+    __slots__ = ('msg', 'log_format')
+
+    def __init__(self, msg: Message, log_format: LogFormat = LogFormat.SUMMARY):
+        self.msg = msg
+        self.log_format = log_format
+
+    def __str__(self):
+        if self.log_format is LogFormat.XML:
+            return repr(self.msg)
+        return self.msg.summary()
+
+
+# Frames the scanner of LazyMessage accepts: a Hermes root with a data element without
+# children, names and attribute values of printable ASCII without entity references.
+# This is a subset of well-formed XML, anything else is parsed by ElementTree.
+# Possessive quantifiers, the grammar never needs to backtrack.
+_WS = rb'[ \t\r\n]'
+_NAME = rb'[A-Za-z_][A-Za-z0-9_.-]*+'
+_VALUE = rb'"[\x20\x21\x23-\x25\x27-\x3b\x3d-\x7e]*+"|\'[\x20-\x25\x28-\x3b\x3d-\x7e]*+\''
+_ATTRIBUTES = rb'(?:' + _WS + rb'++' + _NAME + _WS + rb'*+=' + _WS + rb'*+(?:' + _VALUE + rb'))*+'
+_FRAME_PATTERN = re.compile(_WS + rb'*+<Hermes(' + _ATTRIBUTES + rb')' + _WS + rb'*+>(' + _WS + rb'*+)'
+                            rb'<(' + _NAME + rb')(' + _ATTRIBUTES + rb')' + _WS + rb'*+'
+                            rb'(?:/>|>(' + _WS + rb'*+)</\3' + _WS + rb'*+>)'
+                            rb'(' + _WS + rb'*+)</Hermes' + _WS + rb'*+>' + _WS + rb'*+')
+_ATTRIBUTE_PATTERN = re.compile(r'([A-Za-z_][A-Za-z0-9_.-]*)[ \t\r\n]*=[ \t\r\n]*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def _scan_attributes(attributes: bytes) -> dict:
+    """Attributes matched by _ATTRIBUTES, None if a name is repeated."""
+    text = attributes.decode('ascii')
+    if "'" in text:
+        items = [(name, double_quoted or single_quoted)
+                 for name, double_quoted, single_quoted in _ATTRIBUTE_PATTERN.findall(text)]
+    else:
+        # only double quoted values without quotes in them, split is much faster than findall
+        parts = text.split('"')
+        items = list(zip((part.strip(' \t\r\n=') for part in parts[0:-1:2]), parts[1::2]))
+    attrib = dict(items)
+    return attrib if len(attrib) == len(items) else None
+
+
+def parse_message(frame) -> Message:
+    """Message of a received frame, a LazyMessage if the frame is simple enough to be scanned."""
+    match = _FRAME_PATTERN.fullmatch(frame)
+    if match is not None:
+        root_attributes, root_text, tag, attributes, data_text, data_tail = match.groups()
+        root_attrib = _scan_attributes(root_attributes)
+        attrib = _scan_attributes(attributes)
+        if root_attrib is not None and attrib is not None:
+            return LazyMessage(tag.decode('ascii'), attrib, root_attrib,
+                               (root_text, data_text, data_tail))
+    return Message(ET.fromstring(frame))
+
+
+class LazyMessage(Message):
+    """Received message scanned without parsing, see parse_message. The elements are
+       built from the scanned values when data or xml_root is first accessed, so a
+       caller only looking at the tag, timestamp or attributes with get does not pay
+       for them.
+    """
+    def __init__(self, tag: str, attrib: dict, root_attrib: dict, texts: tuple):
+        # pylint: disable=super-init-not-called
+        self._tag = tag
+        self._attrib = attrib
+        self._root_attrib = root_attrib
+        self._texts = texts  # whitespace around the data element, as ElementTree keeps it
+        self._root = None
+        self._data = None
+
+    @property
+    def xml_root(self):
+        if self._root is None:
+            self._build()
+        return self._root
+
+    @property
+    def timestamp(self):
+        if self._root is None:
+            return self._root_attrib.get("Timestamp")
+        return self._root.get("Timestamp")
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._build()
+        return self._data
+
+    @property
+    def tag(self):
+        return self._tag
+
+    def get(self, name, default=None):
+        if self._data is None:
+            return self._attrib.get(name, default)
+        return self._data.get(name, default)
+
+    def summary(self) -> str:
+        return summary_line(self._tag, self._attrib if self._data is None else self._data.attrib)
+
+    def _build(self):
+        root_text, data_text, data_tail = (text.decode('ascii') or None if text is not None else None
+                                           for text in self._texts)
+        self._root = ET.Element("Hermes", self._root_attrib)
+        self._root.text = root_text
+        self._data = ET.SubElement(self._root, self._tag, self._attrib)
+        self._data.text = data_text
+        self._data.tail = data_tail
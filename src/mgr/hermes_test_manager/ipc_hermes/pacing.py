@@ -0,0 +1,90 @@
+"""Send pacing policies for IPC-Hermes-9852 connections.
+
+By default a connection sends as fast as the socket accepts the bytes.
+A pacing policy can be assigned to ClientServer.pacing to enforce a
+delay between consecutive messages, e.g. to emulate a slow machine or
+to run flood and soak tests at a controlled rate.
+"""
+
+import time
+import random
+
+
+class Pacing:
+    """Base class for pacing policies. Enforces the delay returned by
+       interval() between the end of one send and the start of the next.
+    """
+    def __init__(self):
+        self._next_send = None
+
+    def interval(self) -> float:
+        """Seconds to wait before the next message. To be overridden by subclasses."""
+        return 0.0
+
+    def delay(self) -> float:
+        """Seconds left until the next message is allowed to be sent."""
+        if self._next_send is None:
+            return 0.0
+        return max(0.0, self._next_send - time.monotonic())
+
+    def before_send(self) -> None:
+        """Block until the next message is allowed to be sent."""
+        remaining = self.delay()
+        if remaining > 0:
+            time.sleep(remaining)
+
+    def after_send(self) -> None:
+        """Schedule the earliest time for the next message."""
+        self._next_send = time.monotonic() + self.interval()
+
+    def reset(self) -> None:
+        """Forget the previous send, the next message is sent immediately."""
+        self._next_send = None
+
+
+class FixedPacing(Pacing):
+    """Fixed delay between messages."""
+    def __init__(self, delay_secs: float):
+        super().__init__()
+        self.delay_secs = delay_secs
+
+    def interval(self) -> float:
+        return self.delay_secs
+
+
+class JitteredPacing(Pacing):
+    """Uniformly distributed random delay between messages.
+       A seed can be given to make a test run reproducible.
+    """
+    def __init__(self, min_secs: float, max_secs: float, seed=None):
+        super().__init__()
+        if min_secs > max_secs:
+            raise ValueError(f"min_secs ({min_secs}) larger than max_secs ({max_secs})")
+        self.min_secs = min_secs
+        self.max_secs = max_secs
+        self._random = random.Random(seed)
+
+    def interval(self) -> float:
+        return self._random.uniform(self.min_secs, self.max_secs)
+
+
+class RatePacing(Pacing):
+    """Send at a fixed number of messages per second.
+       The schedule does not drift, time spent sending is included in the period.
+    """
+    def __init__(self, messages_per_second: float):
+        super().__init__()
+        if messages_per_second <= 0:
+            raise ValueError(f"messages_per_second must be positive, found: {messages_per_second}")
+        self.period_secs = 1.0 / messages_per_second
+
+    def interval(self) -> float:
+        return self.period_secs
+
+    def after_send(self) -> None:
+        now = time.monotonic()
+        if self._next_send is None or self._next_send + self.period_secs < now:
+            # first message or fallen behind schedule, restart from now
+            self._next_send = now + self.period_secs
+        else:
+            self._next_send += self.period_secs
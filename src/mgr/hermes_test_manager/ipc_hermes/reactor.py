@@ -0,0 +1,146 @@
+"""Shared selector thread for many IPC-Hermes-9852 connections.
+
+By default each connection runs its own listening thread. Connections
+created with a Reactor instead register their sockets with the reactor,
+so one thread serves all of them:
+
+    reactor = shared_reactor()
+    connection = UpstreamConnection(reactor=reactor)
+"""
+
+import socket
+import logging
+import threading
+import selectors
+
+from ipc_hermes.framing import BUFFERSIZE
+
+if hasattr(selectors, 'EpollSelector'):
+    _ReactorSelector = selectors.EpollSelector
+elif hasattr(selectors, 'PollSelector'):
+    _ReactorSelector = selectors.PollSelector
+else:
+    _ReactorSelector = selectors.SelectSelector
+
+_shared_reactor = None
+_shared_reactor_lock = threading.Lock()
+
+
+class Waker:
+    """Self-pipe used to wake up a thread blocked in select()."""
+    def __init__(self):
+        self._reader, self._writer = socket.socketpair()
+        self._reader.setblocking(False)
+        self._writer.setblocking(False)
+
+    @property
+    def reader(self) -> socket.socket:
+        """The end to register with the selector."""
+        return self._reader
+
+    def wake(self) -> None:
+        """Make the reader readable, a full pipe is already readable."""
+        try:
+            self._writer.send(b'\0')
+        except OSError:
+            pass
+
+    def drain(self) -> None:
+        """Consume all pending wake-ups."""
+        try:
+            while self._reader.recv(BUFFERSIZE):
+                pass
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        """Close both ends."""
+        self._reader.close()
+        self._writer.close()
+
+
+class Reactor:
+    """Single daemon thread dispatching read events of many sockets.
+
+       Each socket is registered with a callback, which is called with
+       the socket when it is readable, and an error handler, which is
+       called with the exception if the callback raises.
+       The socket is unregistered before the error handler is called.
+       Callbacks run on the reactor thread and should not block.
+    """
+    def __init__(self):
+        self._selector = _ReactorSelector()
+        self._lock = threading.RLock()
+        self._waker = Waker()
+        self._selector.register(self._waker.reader, selectors.EVENT_READ, None)
+        self._thread = None
+        self._log = logging.getLogger('ipc_hermes')
+
+    def register(self, fileobj, callback, on_error) -> None:
+        """Start dispatching read events of the file object to callback."""
+        with self._lock:
+            self._selector.register(fileobj, selectors.EVENT_READ, (callback, on_error))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='ipc_hermes_reactor')
+                self._thread.daemon = True
+                self._thread.start()
+                self._log.debug('Reactor thread started')
+        self._waker.wake()
+
+    def unregister(self, fileobj) -> None:
+        """Stop dispatching events of the file object. Unknown file objects are ignored.
+           When this returns, no callback for the file object is running or will be run.
+        """
+        with self._lock:
+            try:
+                self._selector.unregister(fileobj)
+            except (KeyError, ValueError):
+                pass
+        self._waker.wake()
+
+    def __len__(self) -> int:
+        """Number of registered file objects."""
+        with self._lock:
+            return len(self._selector.get_map()) - 1
+
+    def _run(self) -> None:
+        """Dispatch events until the process exits."""
+        selector_map = self._selector.get_map()
+        while True:
+            events = self._selector.select()
+            with self._lock:
+                for key, _ in events:
+                    if key.data is None:
+                        self._waker.drain()
+                        continue
+                    if selector_map.get(key.fileobj) is not key:
+                        # unregistered by another callback or thread after select() returned
+                        continue
+                    callback, on_error = key.data
+                    try:
+                        callback(key.fileobj)
+                    except Exception as exc:  # pylint: disable=broad-exception-caught
+                        self._on_callback_error(key.fileobj, on_error, exc)
+
+    def _on_callback_error(self, fileobj, on_error, exc: Exception) -> None:
+        """Unregister the file object and pass the exception to its error handler,
+           the reactor keeps serving the other file objects.
+        """
+        if isinstance(exc, IOError):
+            self._log.debug('IOError in reactor callback: %s', exc)
+        else:
+            self._log.error('Exception in reactor callback: %r', exc, exc_info=exc)
+        self.unregister(fileobj)
+        try:
+            on_error(exc)
+        except Exception:  # pylint: disable=broad-exception-caught
+            self._log.exception('Exception in reactor error handler')
+
+
+def shared_reactor() -> Reactor:
+    """Return the process-wide reactor, created on first use."""
+    global _shared_reactor  # pylint: disable=global-statement
+    with _shared_reactor_lock:
+        if _shared_reactor is None:
+            _shared_reactor = Reactor()
+        return _shared_reactor
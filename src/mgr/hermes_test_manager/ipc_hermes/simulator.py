@@ -0,0 +1,392 @@
+"""Simulated IPC-Hermes-9852 machine, a stand-in for a system under test.
+
+Each lane has both interfaces of a machine. The downstream interface is a
+server offering the board in the machine to the next machine, the
+upstream interface is a client connecting to the previous machine to take
+a board. Boards taken upstream are passed on downstream, optionally new
+boards are put into an empty machine at a fixed interval. All lanes run in
+a single event loop, so one process can serve many lanes:
+
+    python -m ipc_hermes.simulator --lanes 4 --port 50101 --upstream-port 50103
+
+Messages are checked by the state machines of the connections, a protocol
+error is answered with a fatal Notification and the connection is closed.
+Response delay, transport time and injected faults are configurable per lane.
+"""
+
+import uuid
+import random
+import asyncio
+import logging
+import argparse
+from enum import Enum
+from enum import unique
+
+from ipc_hermes.messages import Message, Tag, TransferState, NotificationCode, SeverityType
+from ipc_hermes.async_connections import AsyncUpstreamConnection, AsyncDownstreamConnection
+from ipc_hermes.connections import ConnectionLost
+from ipc_hermes.state_machine import StateMachineError
+
+RECONNECT_DELAY = 1.0
+
+
+@unique
+class Fault(Enum):
+    """Faults injected at the end of a board transfer."""
+    TRANSFER_INCOMPLETE = 0  # TransferState INCOMPLETE, the board stays where it was
+    WRONG_BOARD_ID = 1  # BoardId of another board
+    DISCONNECT = 2  # close the connection instead of finishing the transfer
+
+
+class LaneConfig:
+    """Configuration of one simulated lane.
+
+    Args:
+        lane_id (str): LaneId sent in ServiceDescription.
+        machine_id (str): MachineId sent in ServiceDescription and of the boards created.
+        host (str): Address the downstream interface listens on.
+        port (int): Port of the downstream interface, None to disable it.
+        upstream_host (str): Address of the machine the upstream interface connects to.
+        upstream_port (int): Port of that machine, None to disable the upstream interface.
+        response_delay (float): Seconds before each message is sent.
+        transport_time (float): Seconds from StartTransport to TransportFinished.
+        board_supply_secs (float): Seconds after which a board is put into an empty machine,
+            None only passes on boards taken upstream.
+        fault_rate (float): Probability of a fault at the end of a board transfer.
+        faults (tuple): Faults to choose from, default all.
+        seed: Seed of the random faults, None for a random seed.
+    """
+    def __init__(self, lane_id: str = "1", machine_id: str = "Hermes Simulator",
+                 host: str = '127.0.0.1', port: int = 50101,
+                 upstream_host: str = '127.0.0.1', upstream_port: int = 50103,
+                 response_delay: float = 0.0, transport_time: float = 0.0,
+                 board_supply_secs: float = None, fault_rate: float = 0.0,
+                 faults: tuple = tuple(Fault), seed=None):
+        self.lane_id = lane_id
+        self.machine_id = machine_id
+        self.host = host
+        self.port = port
+        self.upstream_host = upstream_host
+        self.upstream_port = upstream_port
+        self.response_delay = response_delay
+        self.transport_time = transport_time
+        self.board_supply_secs = board_supply_secs
+        self.fault_rate = fault_rate
+        self.faults = faults
+        self.seed = seed
+
+
+class SimulatedLane:
+    """Both interfaces of one lane and the board in the machine.
+
+       Sessions process events, received messages and changes of the
+       board in the machine, one at a time from their own queue.
+    """
+    def __init__(self, config: LaneConfig):
+        self.config = config
+        self.boards_in = 0
+        self.boards_out = 0
+        self.faults_injected = 0
+        self.protocol_errors = 0
+        self._board = None  # (BoardId, BoardIdCreatedBy) of the board in the machine
+        self._listeners = set()
+        self._random = random.Random(config.seed)
+        self._log = logging.getLogger('ipc_hermes')
+
+    async def run(self) -> None:
+        """Serve the interfaces until cancelled."""
+        tasks = []
+        server = None
+        if self.config.port is not None:
+            server = AsyncDownstreamConnection()
+            await server.connect(self.config.host, self.config.port)
+            tasks.append(self._serve_downstream(server))
+        if self.config.upstream_port is not None:
+            tasks.append(self._serve_upstream())
+        if self.config.board_supply_secs is not None:
+            tasks.append(self._supply_boards())
+        self._log.info('Simulated lane %s started', self.config.lane_id)
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            if server is not None:
+                await server.close()
+
+    def _set_board(self, board) -> None:
+        """Put a board into the machine or remove it, and notify all sessions."""
+        self._board = board
+        for events in self._listeners:
+            events.put_nowait(('changed', None))
+
+    def _fault(self):
+        """Fault to inject at the end of a transfer, None for a regular transfer."""
+        if not self.config.faults or self._random.random() >= self.config.fault_rate:
+            return None
+        fault = self._random.choice(self.config.faults)
+        self.faults_injected += 1
+        self._log.info('Lane %s injects fault: %s', self.config.lane_id, fault.name)
+        return fault
+
+    async def _send(self, connection, msg: Message) -> None:
+        """Send after the configured response delay."""
+        if self.config.response_delay:
+            await asyncio.sleep(self.config.response_delay)
+        await connection.send_msg(msg)
+
+    async def _protocol_error(self, connection, exc: StateMachineError) -> None:
+        """Tell the other end about the protocol error, the caller closes the connection."""
+        self.protocol_errors += 1
+        self._log.warning('Lane %s protocol error: %s', self.config.lane_id, exc)
+        try:
+            await connection.send_msg(Message.Notification(NotificationCode.PROTOCOL_ERROR,
+                                                           SeverityType.FATAL, str(exc)))
+        except ConnectionLost:
+            pass
+
+    async def _session(self, connection, handler) -> None:
+        """Run the handler with the events of one connection, until the connection is lost."""
+        events = asyncio.Queue()
+
+        async def receive():
+            try:
+                while True:
+                    events.put_nowait(('message', await connection.expect_message(None, None)))
+            except (ConnectionLost, StateMachineError) as exc:
+                events.put_nowait(('error', exc))
+
+        receiver = asyncio.ensure_future(receive())
+        self._listeners.add(events)
+        try:
+            await handler(connection, events)
+        finally:
+            self._listeners.discard(events)
+            receiver.cancel()
+
+    @staticmethod
+    async def _next_event(events: asyncio.Queue) -> tuple:
+        """Next received message or machine change, raises the error ending the session."""
+        kind, value = await events.get()
+        if kind == 'error':
+            raise value
+        return kind, value
+
+    async def _serve_downstream(self, server: AsyncDownstreamConnection) -> None:
+        """Accept the next machine, one at a time."""
+        while True:
+            await server.wait_for_connection(None)
+            connection_id = server.connection_id
+            try:
+                await self._session(server, self._downstream_session)
+            except StateMachineError as exc:
+                await self._protocol_error(server, exc)
+            except ConnectionLost as exc:
+                self._log.debug('Lane %s downstream session ended: %s', self.config.lane_id, exc)
+            except Exception:  # pylint: disable=broad-exception-caught
+                self._log.exception('Lane %s downstream session failed', self.config.lane_id)
+            if server.connection_id == connection_id:
+                server.close_client()
+                await server.wait_for_disconnect(None)
+
+    async def _downstream_session(self, connection: AsyncDownstreamConnection,
+                                  events: asyncio.Queue) -> None:
+        """Offer the board in the machine, transport it when the next machine is ready."""
+        handshake = False
+        offered = None
+        while True:
+            kind, msg = await self._next_event(events)
+            if kind == 'message':
+                if msg.tag == Tag.SERVICE_DESCRIPTION:
+                    handshake = True
+                    await self._send(connection, Message.ServiceDescription(self.config.machine_id,
+                                                                            self.config.lane_id))
+                elif msg.tag == Tag.START_TRANSPORT:
+                    if not await self._finish_downstream(connection, msg, offered):
+                        return
+                elif msg.tag == Tag.STOP_TRANSPORT:
+                    transported = offered is not None
+                    offered = None
+                    if transported and msg.data.get('TransferState') != str(TransferState.INCOMPLETE.value):
+                        self.boards_out += 1
+                        self._set_board(None)
+            if handshake and offered is None and self._board is not None:
+                offered = self._board
+                await self._send(connection, Message.BoardAvailable(*offered))
+
+    async def _finish_downstream(self, connection: AsyncDownstreamConnection, msg: Message, offered) -> bool:
+        """Send TransportFinished after the transport time. Returns False if disconnected."""
+        if offered is None:
+            # StartTransport in MachineReady without BoardAvailable, no board to transport
+            self._log.info('Lane %s has no board to transport', self.config.lane_id)
+            await self._send(connection, Message.TransportFinished(TransferState.NOT_STARTED,
+                                                                   msg.data.get('BoardId') or str(uuid.uuid4())))
+            return True
+        await asyncio.sleep(self.config.transport_time)
+        fault = self._fault()
+        if fault is Fault.DISCONNECT:
+            connection.close_client()
+            return False
+        board_id = offered[0]
+        state = TransferState.COMPLETE
+        if fault is Fault.TRANSFER_INCOMPLETE:
+            state = TransferState.INCOMPLETE
+        elif fault is Fault.WRONG_BOARD_ID:
+            board_id = str(uuid.uuid4())
+        await self._send(connection, Message.TransportFinished(state, board_id))
+        return True
+
+    async def _serve_upstream(self) -> None:
+        """Connect to the previous machine, again after each lost connection."""
+        while True:
+            connection = AsyncUpstreamConnection()
+            try:
+                await connection.connect(self.config.upstream_host, self.config.upstream_port)
+                await self._session(connection, self._upstream_session)
+            except StateMachineError as exc:
+                await self._protocol_error(connection, exc)
+            except ConnectionLost as exc:
+                self._log.debug('Lane %s upstream session ended: %s', self.config.lane_id, exc)
+            except Exception:  # pylint: disable=broad-exception-caught
+                self._log.exception('Lane %s upstream session failed', self.config.lane_id)
+            await connection.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _upstream_session(self, connection: AsyncUpstreamConnection,
+                                events: asyncio.Queue) -> None:
+        """Take a board whenever the machine is empty."""
+        await self._send(connection, Message.ServiceDescription(self.config.machine_id,
+                                                                self.config.lane_id))
+        handshake = False
+        ready = False
+        offered = None
+        started = False
+        while True:
+            kind, msg = await self._next_event(events)
+            if kind == 'message':
+                if msg.tag == Tag.SERVICE_DESCRIPTION:
+                    handshake = True
+                elif msg.tag == Tag.BOARD_AVAILABLE:
+                    offered = (msg.data.get('BoardId'), msg.data.get('BoardIdCreatedBy'))
+                elif msg.tag == Tag.REVOKE_BOARD_AVAILABLE:
+                    offered = None
+                elif msg.tag == Tag.TRANSPORT_FINISHED:
+                    if not await self._finish_upstream(connection, msg, offered):
+                        return
+                    ready = started = False
+                    offered = None
+            if handshake and not ready and self._board is None:
+                ready = True
+                await self._send(connection, Message.MachineReady())
+            if ready and offered is not None and not started:
+                started = True
+                await self._send(connection, Message.StartTransport(offered[0]))
+
+    async def _finish_upstream(self, connection: AsyncUpstreamConnection, msg: Message, offered) -> bool:
+        """Send StopTransport and keep a completely received board. Returns False if disconnected."""
+        fault = self._fault()
+        if fault is Fault.DISCONNECT:
+            await connection.close()
+            return False
+        board_id = msg.data.get('BoardId')
+        state = TransferState.COMPLETE
+        if msg.data.get('TransferState') == str(TransferState.INCOMPLETE.value):
+            state = TransferState.INCOMPLETE
+        if fault is Fault.TRANSFER_INCOMPLETE:
+            state = TransferState.INCOMPLETE
+        elif fault is Fault.WRONG_BOARD_ID:
+            board_id = str(uuid.uuid4())
+        await self._send(connection, Message.StopTransport(state, board_id))
+        if state is TransferState.COMPLETE and offered is not None:
+            self.boards_in += 1
+            self._set_board(offered)
+        return True
+
+    async def _supply_boards(self) -> None:
+        """Put a new board into the machine after it has been empty for board_supply_secs."""
+        events = asyncio.Queue()
+        self._listeners.add(events)
+        try:
+            while True:
+                while self._board is not None:
+                    await events.get()
+                await asyncio.sleep(self.config.board_supply_secs)
+                if self._board is None:
+                    self._set_board((str(uuid.uuid4()), self.config.machine_id))
+        finally:
+            self._listeners.discard(events)
+
+
+class Simulator:
+    """Any number of simulated lanes in one event loop.
+
+    Args:
+        configs (list): LaneConfig per lane.
+    """
+    def __init__(self, configs: list):
+        self.lanes = [SimulatedLane(config) for config in configs]
+
+    async def run(self) -> None:
+        """Serve all lanes until cancelled, a failing lane does not stop the others."""
+        results = await asyncio.gather(*(lane.run() for lane in self.lanes), return_exceptions=True)
+        for lane, result in zip(self.lanes, results):
+            if isinstance(result, Exception):
+                logging.getLogger('ipc_hermes').error('Simulated lane %s failed: %r',
+                                                      lane.config.lane_id, result, exc_info=result)
+
+
+def lane_configs(lanes: int, port: int = 50101, upstream_port: int = 50103,
+                 port_step: int = 10, seed: int = None, **kwargs) -> list:
+    """Configurations of lanes 1 to lanes, the ports and seed of lane n are incremented
+       by (n - 1) * port_step and n - 1. Other keyword arguments are passed to each LaneConfig.
+    """
+    configs = []
+    for index in range(lanes):
+        configs.append(LaneConfig(lane_id=str(index + 1),
+                                  port=None if port is None else port + index * port_step,
+                                  upstream_port=None if upstream_port is None else upstream_port + index * port_step,
+                                  seed=None if seed is None else seed + index,
+                                  **kwargs))
+    return configs
+
+
+def main() -> None:
+    """Run the simulator from the command line until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--lanes", type=int, default=1, help="number of lanes, default 1")
+    parser.add_argument("--machine-id", default="Hermes Simulator", help="MachineId of all lanes")
+    parser.add_argument("--host", default='127.0.0.1', help="address the downstream interfaces listen on")
+    parser.add_argument("--port", type=int, default=50101,
+                        help="downstream interface port of the first lane, 0 to disable, default 50101")
+    parser.add_argument("--upstream-host", default='127.0.0.1', help="address of the upstream machine")
+    parser.add_argument("--upstream-port", type=int, default=50103,
+                        help="upstream machine port of the first lane, 0 to disable, default 50103")
+    parser.add_argument("--port-step", type=int, default=10, help="port increment per lane, default 10")
+    parser.add_argument("--response-delay", type=float, default=0.0, metavar="SECONDS",
+                        help="delay before each message is sent")
+    parser.add_argument("--transport-time", type=float, default=0.0, metavar="SECONDS",
+                        help="time from StartTransport to TransportFinished")
+    parser.add_argument("--supply", type=float, metavar="SECONDS",
+                        help="put a new board into an empty machine after SECONDS, default pass-through only")
+    parser.add_argument("--fault-rate", type=float, default=0.0,
+                        help="probability of a fault at the end of a board transfer")
+    parser.add_argument("--faults", default=",".join(fault.name.lower() for fault in Fault),
+                        help="comma separated faults to inject, default all")
+    parser.add_argument("--seed", type=int, help="seed of the injected faults")
+    parser.add_argument("-v", "--verbose", action='store_true', help="log all messages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s [%(name)s] %(levelname)s: %(message)s')
+    faults = tuple(Fault[name.strip().upper()] for name in args.faults.split(",") if name.strip())
+    configs = lane_configs(args.lanes, args.port or None, args.upstream_port or None, args.port_step,
+                           machine_id=args.machine_id, host=args.host, upstream_host=args.upstream_host,
+                           response_delay=args.response_delay, transport_time=args.transport_time,
+                           board_supply_secs=args.supply, fault_rate=args.fault_rate,
+                           faults=faults, seed=args.seed)
+    try:
+        asyncio.run(Simulator(configs).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -65,6 +65,55 @@ DOWNSTREAM_TRANSITION_DICT = {
     }
 
 
+# Transition dicts compiled to integer tables, see TransitionTable
+STATES = tuple(sorted(State, key=lambda state: state.value))  # state id is State.value
+TAGS = (None,) + tuple(value for name, value in vars(Tag).items() if name.isupper())
+TAG_IDS = {tag: tag_id for tag_id, tag in enumerate(TAGS) if tag is not None}  # other tags have id 0
+ILLEGAL = -1
+
+
+class TransitionTable:
+    """Transition dict compiled once into a dense table of state ids:
+       rows[tag id][state id] is the next state id, ILLEGAL if the tag is not
+       allowed in the state. Tags without transitions, including tag id 0 for
+       tags not in Tag, keep the state.
+
+    Args:
+        transition_dict (dict): {tag: {State: State}}, e.g. UPSTREAM_TRANSITION_DICT.
+    """
+    def __init__(self, transition_dict: dict):
+        unchanged = tuple(range(len(STATES)))
+        rows = [unchanged] * len(TAGS)
+        for tag, transitions in transition_dict.items():
+            if tag not in TAG_IDS:
+                raise ValueError(f"Unknown tag in transition dict: {tag}")
+            rows[TAG_IDS[tag]] = tuple(transitions[state].value if state in transitions else ILLEGAL
+                                       for state in STATES)
+        self.rows = tuple(rows)
+
+    @staticmethod
+    def tag_id(tag: str) -> int:
+        """Row of the tag in rows, 0 for tags not in Tag."""
+        return TAG_IDS.get(tag, 0)
+
+    def next_state(self, state: State, tag: str) -> State:
+        """State after the tag, None if the tag is not allowed."""
+        state_id = self.rows[TAG_IDS.get(tag, 0)][state.value]
+        return None if state_id == ILLEGAL else STATES[state_id]
+
+
+UPSTREAM_TABLE = TransitionTable(UPSTREAM_TRANSITION_DICT)
+DOWNSTREAM_TABLE = TransitionTable(DOWNSTREAM_TRANSITION_DICT)
+
+
+def _compiled(transition_dict: dict) -> TransitionTable:
+    if transition_dict is UPSTREAM_TRANSITION_DICT:
+        return UPSTREAM_TABLE
+    if transition_dict is DOWNSTREAM_TRANSITION_DICT:
+        return DOWNSTREAM_TABLE
+    return TransitionTable(transition_dict)
+
+
 class StateMachineError(Exception):
     """Hermes state machine was violated"""
     def __init__(self, state, msg):
@@ -81,54 +130,65 @@ class StateMachine:
         recv_dict (dict): The receive transition dictionary.
     """
     def __init__(self, send_dict, recv_dict):
-        self._state = State.NOT_CONNECTED
-        self._send_dict = send_dict
-        self._recv_dict = recv_dict
+        self.send_table = _compiled(send_dict)
+        self.recv_table = _compiled(recv_dict)
+        self._send_rows = self.send_table.rows
+        self._recv_rows = self.recv_table.rows
+        self._state_id = State.NOT_CONNECTED.value
         self._log = logging.getLogger('ipc_hermes')
 
     def state(self):
         """Get the current state."""
-        return self._state
+        return STATES[self._state_id]
 
     def on_send_tag(self, tag: str, raise_on_error: bool):
         """Handle a send tag. Normally raises StateMachineError if the message is not allowed.
            Argument
                 raise_on_error = False will allow messages that violate the protocol.
         """
-        state_dict = self._send_dict.get(tag)
-        if state_dict is None:
-            # Message tag not defined e.g., Notification, don't change the state.
-            return
-
-        new_state = state_dict.get(self._state)
-        if new_state == self._state:
+        # tags without transitions e.g., Notification, don't change the state
+        new_state_id = self._send_rows[TAG_IDS.get(tag, 0)][self._state_id]
+        if new_state_id == self._state_id:
             # No state change
             return
-        if new_state is None:
+        if new_state_id == ILLEGAL:
             # From-state was not defined, illegal message.
             if raise_on_error:
-                raise StateMachineError(self._state, tag)
+                raise StateMachineError(STATES[self._state_id], tag)
             else:
-                self._log.debug('Illegal %s message sent in %s', tag, self._state)
+                self._log.debug('Illegal %s message sent in %s', tag, STATES[self._state_id])
                 return
-        self._log.info('From: %s, To: %s, Trigger: %s', self._state, new_state, tag)
-        self._state = new_state
+        self._log.info('From: %s, To: %s, Trigger: %s', STATES[self._state_id], STATES[new_state_id], tag)
+        self._state_id = new_state_id
 
     def on_recv(self, msg: Message):
         """Handle a recived message. Raises StateMachineError if the message is not allowed."""
-        state_dict = self._recv_dict.get(msg.tag)
-        if state_dict is None:
+        new_state_id = self._recv_rows[TAG_IDS.get(msg.tag, 0)][self._state_id]
+        if new_state_id == self._state_id:
             return
-
+        if new_state_id == ILLEGAL:
+            raise StateMachineError(STATES[self._state_id], msg)
+        self._log.info('From: %s, To: %s, Trigger: %s', STATES[self._state_id], STATES[new_state_id], msg.tag)
+        self._state_id = new_state_id
+
+    def check_trace(self, trace) -> int:
+        """Run a trace of (tag, sent) pairs through the state machine without logging,
+           e.g. from a capture. Sent tags are checked as strictly as received ones.
+           Returns the index of the first tag not allowed, the state is the one
+           before it, or None if the whole trace is allowed.
+        """
+        send_rows = self._send_rows
+        recv_rows = self._recv_rows
+        state_id = self._state_id
         try:
-            new_state = state_dict[self._state]
-            if new_state == self._state:
-                return
-            self._log.info('From: %s, To: %s, Trigger: %s', self._state, new_state, msg.tag)
-            self._state = new_state
-
-        except KeyError as exc:
-            raise StateMachineError(self._state, msg) from exc
+            for index, (tag, sent) in enumerate(trace):
+                new_state_id = (send_rows if sent else recv_rows)[TAG_IDS.get(tag, 0)][state_id]
+                if new_state_id == ILLEGAL:
+                    return index
+                state_id = new_state_id
+        finally:
+            self._state_id = state_id
+        return None
 
 class UpstreamStateMachine(StateMachine):
     """"IPC-Hermes-9852 upstream state machine."""
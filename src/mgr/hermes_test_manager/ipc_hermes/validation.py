@@ -0,0 +1,359 @@
+"""Table-driven validation of the fields of IPC-Hermes-9852 messages.
+
+SCHEMA declares the attributes of each message tag, their type, whether
+they are mandatory, the Hermes version that introduced them and their
+limits. It is compiled once per Hermes version into a MessageValidator
+per tag, with precompiled patterns and typed converters. A validation
+returns all findings of a message at once:
+
+    for finding in validate(msg, version='1.2'):
+        print(finding.level.name, finding.text)
+
+Findings of level ERROR violate the standard, WARNING marks values that
+are allowed but unusual. Without a version every field of the latest
+version is accepted, with a version newer fields are reported as WARNING.
+"""
+
+import re
+import collections
+from enum import Enum, IntEnum, unique
+
+from ipc_hermes.messages import Tag, Message, NotificationCode, SeverityType, CheckAliveType
+from ipc_hermes.messages import BoardQuality, FlippedBoard, TransferState
+
+GUID_PATTERN = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+VERSION_PATTERN = re.compile(r'[1-9][0-9]{0,2}\.[0-9]{1,3}')
+_INT_PATTERN = re.compile(r'-?[0-9]+')
+_FLOAT_PATTERN = re.compile(r'[-+]?(?:[0-9]+\.?([0-9]*)|\.([0-9]+))(?:[eE][-+]?[0-9]+)?')
+
+
+@unique
+class Level(Enum):
+    """Severity of a finding."""
+    ERROR = 0  # violates the standard
+    WARNING = 1  # allowed, but unusual or not recommended
+
+
+Finding = collections.namedtuple('Finding', ['tag', 'field', 'level', 'text'])
+
+
+class Field:
+    """Declaration of a message attribute, compiled into a check of its value.
+
+    Args:
+        name (str): Attribute name.
+        kind (type): Converter of the value, str, int, float or an IntEnum.
+        mandatory (bool): A missing attribute is an error.
+        since (tuple): Hermes version that introduced the attribute.
+        pattern (re.Pattern): Text values must match it, described by pattern_text.
+        blank (Level): Level of a finding for an empty or blank text value, None to accept it.
+        minimum, maximum: Limits of numeric values, ERROR outside.
+        positive (bool): Numeric values must be larger than zero.
+        warn_below, warn_above: Limits of numeric values, WARNING outside.
+        max_decimals (int): WARNING for float values with more decimals.
+        warn_text (str): WARNING if the text value contains it, case insensitive.
+        description (str): Where the attribute is, in texts of findings.
+    """
+    def __init__(self, name: str, kind: type = str, mandatory: bool = False, since: tuple = (1, 0),
+                 pattern: re.Pattern = None, pattern_text: str = None, blank: Level = None,
+                 minimum=None, maximum=None, positive: bool = False, warn_below=None, warn_above=None,
+                 max_decimals: int = None, warn_text: str = None, description: str = None):
+        self.name = name
+        self.kind = kind
+        self.mandatory = mandatory
+        self.since = since
+        self.pattern = pattern
+        self.pattern_text = pattern_text
+        self.blank = blank
+        self.minimum = minimum
+        self.maximum = maximum
+        self.positive = positive
+        self.warn_below = warn_below
+        self.warn_above = warn_above
+        self.max_decimals = max_decimals
+        self.warn_text = warn_text
+        self.description = description
+
+    def compile(self, tag: str, where: str = None):
+        """Function appending the findings of a value in a message with the tag to a list.
+           Texts of findings refer to where, the description or the tag by default.
+        """
+        name = self.name
+        where = where or self.description or tag
+        checks = []
+        if self.pattern is not None:
+            checks.append(_pattern_check(f"{name} has not correct format {self.pattern_text} in {where}, "
+                                         "found: %s", self.pattern))
+        if self.blank is not None:
+            checks.append(_blank_check(f"{name} is empty string in {where}", self.blank))
+        if self.warn_text is not None:
+            checks.append(_text_check(f"{name} in {where} has text '{self.warn_text}' in it", self.warn_text))
+        if self.positive:
+            checks.append(_limit_check(f"{name} in {where} is not positive, found: %s",
+                                       Level.ERROR, float.__le__, 0.0))
+        for limit, level, compare, relation in ((self.minimum, Level.ERROR, float.__lt__, 'smaller'),
+                                                (self.maximum, Level.ERROR, float.__gt__, 'larger'),
+                                                (self.warn_below, Level.WARNING, float.__lt__, 'smaller'),
+                                                (self.warn_above, Level.WARNING, float.__gt__, 'larger')):
+            if limit is not None:
+                checks.append(_limit_check(f"{name} in {where} is {relation} than {limit}, found: %s",
+                                           level, compare, float(limit)))
+        if self.max_decimals is not None:
+            checks.append(_decimals_check(f"{name} in {where} has more than {self.max_decimals} decimals, "
+                                          "found: %s", self.max_decimals))
+        convert = self._converter(tag, where)
+
+        def check(value: str, findings: list) -> None:
+            converted = convert(value)
+            if isinstance(converted, Finding):
+                findings.append(converted)
+                return
+            for field_check in checks:
+                result = field_check(value, converted)
+                if result is not None:
+                    findings.append(Finding(tag, name, *result))
+        return check
+
+    def _converter(self, tag: str, where: str):
+        """Function returning the typed value, or a Finding if the text cannot be converted."""
+        name = self.name
+        kind = self.kind
+        if kind is str:
+            return lambda value: value
+        if kind is int or (isinstance(kind, type) and issubclass(kind, IntEnum)):
+            type_text = 'an integer' if kind is int else f'a valid {kind.__name__}'
+            def convert_int(value: str):
+                if _INT_PATTERN.fullmatch(value):
+                    number = int(value)
+                    if kind is int or number in kind._value2member_map_:  # pylint: disable=protected-access
+                        return float(number)
+                return Finding(tag, name, Level.ERROR, f"{name} in {where} is not {type_text}, found: {value}")
+            return convert_int
+        if kind is float:
+            def convert_float(value: str):
+                if _FLOAT_PATTERN.fullmatch(value):
+                    return float(value)
+                return Finding(tag, name, Level.ERROR, f"{name} in {where} is not a float, found: {value}")
+            return convert_float
+        raise ValueError(f"Unsupported kind of {name}: {kind}")
+
+
+# Checks of a value, called with the text and the converted value,
+# return (Level, text) of a finding or None
+
+def _pattern_check(text: str, pattern: re.Pattern):
+    return lambda value, _: None if pattern.fullmatch(value) else (Level.ERROR, text % value)
+
+
+def _blank_check(text: str, level: Level):
+    return lambda value, _: (level, text) if not value.strip() else None
+
+
+def _text_check(text: str, contained: str):
+    contained = contained.lower()
+    return lambda value, _: (Level.WARNING, text) if contained in value.lower() else None
+
+
+def _limit_check(text: str, level: Level, compare, limit: float):
+    return lambda value, number: (level, text % value) if compare(number, limit) else None
+
+
+def _decimals_check(text: str, max_decimals: int):
+    def check(value: str, _):
+        match = _FLOAT_PATTERN.fullmatch(value)
+        decimals = len(match.group(1) or match.group(2) or '')
+        return (Level.WARNING, text % value) if decimals > max_decimals else None
+    return check
+
+
+def _board_id(mandatory: bool) -> Field:
+    return Field('BoardId', mandatory=mandatory, pattern=GUID_PATTERN,
+                 pattern_text='GUID xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx')
+
+
+def _barcode(name: str) -> Field:
+    return Field(name, blank=Level.WARNING, warn_text='error', description='board info')
+
+
+def _dimension(name: str, since: tuple = (1, 0), **warnings) -> Field:
+    return Field(name, float, since=since, positive=True, max_decimals=2, description='board info', **warnings)
+
+
+_DIMENSIONS = (
+    _dimension('Length', warn_above=2000, warn_below=2),
+    _dimension('Width', warn_above=2000, warn_below=2),
+    _dimension('Thickness', warn_above=100, warn_below=0.1),
+    _dimension('ConveyorSpeed', warn_above=600, warn_below=6),
+    _dimension('TopClearanceHeight', warn_above=100),
+    _dimension('BottomClearanceHeight', warn_above=100),
+    _dimension('Weight', since=(1, 1), warn_above=10000, warn_below=1),
+)
+
+_ROUTING = (
+    Field('WorkOrderId', since=(1, 2), blank=Level.WARNING),
+    Field('BatchId', since=(1, 3), blank=Level.WARNING),
+    Field('Route', int, since=(1, 4), minimum=0, maximum=65535),
+    Field('Action', int, since=(1, 4), minimum=0, maximum=65535),
+)
+
+_BOARD_INFO = (
+    _board_id(True),
+    Field('BoardIdCreatedBy', mandatory=True, blank=Level.ERROR, description='board info'),
+    Field('FailedBoard', BoardQuality, mandatory=True),
+    Field('ProductTypeId'),
+    Field('FlippedBoard', FlippedBoard, mandatory=True),
+    _barcode('TopBarcode'),
+    _barcode('BottomBarcode'),
+) + _DIMENSIONS + _ROUTING
+
+SUB_BOARD_FIELDS = (
+    Field('Pos', int, mandatory=True, minimum=1),
+    Field('Bc', blank=Level.WARNING),
+    Field('St', int, mandatory=True, minimum=0),
+)
+
+# Attributes of the data element of each message tag, tags not listed have none
+SCHEMA = {
+    Tag.CHECK_ALIVE: (
+        Field('Type', CheckAliveType, since=(1, 1)),
+        Field('Id', since=(1, 1)),
+    ),
+    Tag.SERVICE_DESCRIPTION: (
+        Field('MachineId', mandatory=True, blank=Level.WARNING),
+        Field('LaneId', int, mandatory=True, minimum=1),
+        Field('InterfaceId'),
+        Field('Version', mandatory=True, pattern=VERSION_PATTERN, pattern_text='xxx.yyy'),
+    ),
+    Tag.NOTIFICATION: (
+        Field('NotificationCode', NotificationCode, mandatory=True),
+        Field('Severity', SeverityType, mandatory=True),
+        Field('Description', mandatory=True),
+    ),
+    Tag.BOARD_AVAILABLE: _BOARD_INFO,
+    Tag.BOARD_FORECAST: (
+        Field('ForecastId', since=(1, 2)),
+        Field('TimeUntilAvailable', float, minimum=0),
+        _board_id(False),
+        Field('BoardIdCreatedBy', blank=Level.ERROR, description='board info'),
+        Field('FailedBoard', BoardQuality, mandatory=True),
+        Field('ProductTypeId'),
+        Field('FlippedBoard', FlippedBoard, mandatory=True),
+        _barcode('TopBarcode'),
+        _barcode('BottomBarcode'),
+    ) + _DIMENSIONS + _ROUTING,
+    Tag.MACHINE_READY: (
+        Field('FailedBoard', BoardQuality, mandatory=True),
+        Field('ForecastId', since=(1, 2)),
+        _board_id(False),
+        Field('ProductTypeId'),
+        Field('FlippedBoard', FlippedBoard),
+    ) + _DIMENSIONS + _ROUTING,
+    Tag.START_TRANSPORT: (
+        _board_id(True),
+        _dimension('ConveyorSpeed', warn_above=600, warn_below=6),
+    ),
+    Tag.STOP_TRANSPORT: (
+        Field('TransferState', TransferState, mandatory=True),
+        _board_id(True),
+    ),
+    Tag.TRANSPORT_FINISHED: (
+        Field('TransferState', TransferState, mandatory=True),
+        _board_id(True),
+    ),
+}
+
+# Child elements of the data element with their own fields, checked when present
+CHILD_SCHEMA = {
+    Tag.BOARD_AVAILABLE: {'SubBoards': ('SB', SUB_BOARD_FIELDS, (1, 4))},
+    Tag.BOARD_FORECAST: {'SubBoards': ('SB', SUB_BOARD_FIELDS, (1, 4))},
+}
+
+
+def parse_version(version: str) -> tuple:
+    """Hermes version as a tuple, None if it is not of the form xxx.yyy."""
+    if version is None or not VERSION_PATTERN.fullmatch(version):
+        return None
+    major, minor = version.split('.')
+    return int(major), int(minor)
+
+
+class MessageValidator:
+    """Compiled validation of the messages with one tag.
+
+    Args:
+        tag (str): Message tag.
+        version (tuple): Hermes version of the sender, None for the latest.
+    """
+    def __init__(self, tag: str, version: tuple = None):
+        self.tag = tag
+        self._fields = [self._compile(field, version) for field in SCHEMA.get(tag, ())]
+        self._children = []  # (child tag, item tag, compiled fields, since)
+        for child_tag, (item_tag, fields, since) in CHILD_SCHEMA.get(tag, {}).items():
+            self._children.append((child_tag, item_tag,
+                                   [self._compile(field, version, f"{child_tag} {item_tag}")
+                                    for field in fields], since))
+        self._version = version
+
+    def _compile(self, field: Field, version: tuple, where: str = None) -> tuple:
+        """(name, mandatory, check, version that introduced the field if newer than the sender)"""
+        too_new = version is not None and field.since > version
+        return (field.name, field.mandatory and not too_new, field.compile(self.tag, where),
+                field.since if too_new else None)
+
+    def validate(self, msg: Message) -> list:
+        """All findings of the message, in the order of the schema."""
+        findings = []
+        data = msg.data
+        self._validate_attributes(self.tag, data.attrib, self._fields, findings)
+        for child_tag, item_tag, fields, since in self._children:
+            child = data.find(child_tag)
+            if child is None:
+                continue
+            self._check_version(self.tag, child_tag, since, findings)
+            positions = set()
+            for item in child:
+                if item.tag != item_tag:
+                    findings.append(Finding(self.tag, child_tag, Level.ERROR,
+                                            f"{child_tag} in {self.tag} contains {item.tag}, expected {item_tag}"))
+                    continue
+                self._validate_attributes(self.tag, item.attrib, fields, findings)
+                position = item.get('Pos')
+                if position in positions:
+                    findings.append(Finding(self.tag, child_tag, Level.ERROR,
+                                            f"{child_tag} in {self.tag} has Pos {position} more than once"))
+                positions.add(position)
+        return findings
+
+    def _validate_attributes(self, tag: str, attrib: dict, fields: list, findings: list) -> None:
+        for name, mandatory, check, too_new in fields:
+            value = attrib.get(name)
+            if value is None:
+                if mandatory:
+                    findings.append(Finding(tag, name, Level.ERROR, f"Mandatory {name} is missing in {tag}"))
+                continue
+            if too_new is not None:
+                self._check_version(tag, name, too_new, findings)
+            check(value, findings)
+
+    def _check_version(self, tag: str, name: str, since: tuple, findings: list) -> None:
+        if self._version is not None and since > self._version:
+            findings.append(Finding(tag, name, Level.WARNING,
+                                    f"{name} in {tag} is defined since IPC-Hermes {since[0]}.{since[1]}, "
+                                    f"sender uses {self._version[0]}.{self._version[1]}"))
+
+
+_validators = {}  # (tag, version): MessageValidator
+
+
+def validator(tag: str, version: str = None) -> MessageValidator:
+    """Compiled validator of the tag for the Hermes version, shared by all callers."""
+    key = (tag, parse_version(version))
+    compiled = _validators.get(key)
+    if compiled is None:
+        compiled = _validators[key] = MessageValidator(*key)
+    return compiled
+
+
+def validate(msg: Message, version: str = None) -> list:
+    """All findings of a message sent with the Hermes version, None for the latest."""
+    return validator(msg.tag, version).validate(msg)
@@ -0,0 +1,252 @@
+"""Sustained-load board transfers against a system under test.
+
+The interactive test cases move exactly one board. The load generator
+repeats the complete board transfer cycle for a set duration, either as
+fast as the system under test allows or at a target rate, and reports
+boards per hour, cycle time percentiles and protocol errors.
+
+    >>>> Board transport direction >>>>
+    TO_SUT:   this code (downstream server)  ---> system under test
+    FROM_SUT: system under test ---> this code (upstream client)
+"""
+import math
+import time
+import uuid
+import logging
+from enum import Enum
+from enum import unique
+
+from ipc_hermes.connections import UpstreamConnection, DownstreamConnection, ConnectionLost
+from ipc_hermes.connections import RECEIVE_TIMEOUT, SOCKET_TIMEOUT
+from ipc_hermes.messages import Message, Tag, TransferState
+from ipc_hermes.pacing import RatePacing
+from ipc_hermes.serializer import FrameCache
+from ipc_hermes.state_machine import StateMachineError
+
+PROGRESS_INTERVAL = 10.0
+RECONNECT_DELAY = 1.0
+
+
+@unique
+class LoadDirection(Enum):
+    """Board transport direction relative to the system under test."""
+    TO_SUT = 0
+    FROM_SUT = 1
+
+
+class CycleError(Exception):
+    """Board transfer cycle did not follow the expected sequence"""
+
+
+class _RunEnded(Exception):
+    """The run duration ended while waiting for the system under test"""
+
+
+class LoadReport:
+    """Result of a load run."""
+    def __init__(self, direction: LoadDirection):
+        self.direction = direction
+        self.duration_secs = 0.0
+        self.cycle_times = []
+        self.errors = []
+
+    @property
+    def cycles(self) -> int:
+        """Number of completed board transfers."""
+        return len(self.cycle_times)
+
+    @property
+    def boards_per_hour(self) -> float:
+        """Completed board transfers per hour over the whole run."""
+        if self.duration_secs <= 0:
+            return 0.0
+        return self.cycles * 3600.0 / self.duration_secs
+
+    def percentile(self, percent: float) -> float:
+        """Cycle time in seconds below which the given percentage of cycles completed,
+           nearest-rank method. Returns 0.0 if no cycle completed.
+        """
+        if not self.cycle_times:
+            return 0.0
+        ordered = sorted(self.cycle_times)
+        rank = min(max(1, math.ceil(len(ordered) * percent / 100)), len(ordered))
+        return ordered[rank - 1]
+
+    def __str__(self):
+        lines = [f"Direction: {self.direction.name}",
+                 f"Duration: {self.duration_secs:.1f} s",
+                 f"Boards: {self.cycles}",
+                 f"Boards per hour: {self.boards_per_hour:.0f}"]
+        if self.cycle_times:
+            lines.append("Cycle time p50/p90/p99/max: " +
+                         "/".join(f"{self.percentile(p) * 1000:.1f}" for p in (50, 90, 99, 100)) +
+                         " ms")
+        lines.append(f"Protocol errors: {len(self.errors)}")
+        lines.extend(f"  {error}" for error in self.errors)
+        return "\n".join(lines)
+
+
+class LoadGenerator:
+    """Repeat the BoardAvailable, MachineReady, StartTransport, TransportFinished,
+       StopTransport cycle against the system under test.
+
+       A protocol error or lost connection is recorded, then the session
+       is opened again, including the ServiceDescription handshake.
+
+    Args:
+        direction (LoadDirection): Board transport direction.
+        host (str): Address of the system under test for FROM_SUT, address to listen on for TO_SUT.
+        port (str|int): Port of the system under test for FROM_SUT, port to listen on for TO_SUT.
+        machine_id (str): MachineId sent in ServiceDescription and BoardAvailable.
+        lane_id (str): LaneId sent in ServiceDescription.
+        cycles_per_second (float): Target rate, default None is as fast as possible.
+        receive_timeout (float): Seconds to wait for each message of the system under test,
+            but not beyond the end of the run. A cycle cut short by the end is no error.
+        max_errors (int): Stop the run after this many protocol errors.
+        progress (function): Optional, called with the LoadReport every PROGRESS_INTERVAL seconds.
+    """
+    def __init__(self, direction: LoadDirection, host: str, port: str|int,
+                 machine_id: str, lane_id: str, cycles_per_second: float = None,
+                 receive_timeout: float = RECEIVE_TIMEOUT, max_errors: int = 10, progress=None):
+        self.direction = direction
+        self.host = host
+        self.port = port
+        self.machine_id = machine_id
+        self.lane_id = lane_id
+        self.cycles_per_second = cycles_per_second
+        self.receive_timeout = receive_timeout
+        self.max_errors = max_errors
+        self.progress = progress
+        self._frames = FrameCache()
+        self._log = logging.getLogger('hermes_test_api')
+
+    def run(self, duration_secs: float) -> LoadReport:
+        """Run board transfer cycles for the given duration and return the report."""
+        report = LoadReport(self.direction)
+        pacing = RatePacing(self.cycles_per_second) if self.cycles_per_second else None
+        start = time.monotonic()
+        deadline = start + duration_secs
+        next_progress = start + PROGRESS_INTERVAL
+        connection = None
+        self._log.info('Start %s load for %s seconds', self.direction.name, duration_secs)
+        try:
+            while time.monotonic() < deadline and len(report.errors) < self.max_errors:
+                if connection is None:
+                    try:
+                        connection = self._open_session(report, deadline)
+                    except _RunEnded:
+                        break
+                    if connection is None:
+                        time.sleep(RECONNECT_DELAY)
+                        continue
+                if pacing is not None:
+                    if time.monotonic() + pacing.delay() >= deadline:
+                        break
+                    pacing.before_send()
+                    pacing.after_send()
+                cycle_start = time.perf_counter()
+                try:
+                    if self.direction is LoadDirection.TO_SUT:
+                        self._cycle_to_sut(connection, deadline)
+                    else:
+                        self._cycle_from_sut(connection, deadline)
+                except _RunEnded:
+                    break
+                except (ConnectionLost, StateMachineError, CycleError) as exc:
+                    self._record_error(report, exc)
+                    connection.close()
+                    connection = None
+                    continue
+                report.cycle_times.append(time.perf_counter() - cycle_start)
+                if self.progress is not None and time.monotonic() >= next_progress:
+                    next_progress += PROGRESS_INTERVAL
+                    report.duration_secs = time.monotonic() - start
+                    self.progress(report)
+        finally:
+            if connection is not None:
+                connection.close()
+            report.duration_secs = time.monotonic() - start
+        self._log.info('Load done, %s boards, %.0f boards per hour, %s errors',
+                       report.cycles, report.boards_per_hour, len(report.errors))
+        return report
+
+    def _open_session(self, report: LoadReport, deadline: float):
+        """Connect and exchange ServiceDescriptions. Returns None after recording an error."""
+        service_description = self._frames.get(Message.ServiceDescription, self.machine_id, self.lane_id)
+        if self.direction is LoadDirection.TO_SUT:
+            connection = DownstreamConnection()
+        else:
+            connection = UpstreamConnection()
+        try:
+            connection.connect(self.host, self.port)
+            if self.direction is LoadDirection.TO_SUT:
+                self._wait(deadline, SOCKET_TIMEOUT, connection.wait_for_connection)
+                self._expect(connection, Tag.SERVICE_DESCRIPTION, deadline)
+                connection.send_msg(service_description)
+            else:
+                connection.start_receiving()
+                connection.send_msg(service_description)
+                self._expect(connection, Tag.SERVICE_DESCRIPTION, deadline)
+        except _RunEnded:
+            connection.close()
+            raise
+        except (OSError, ConnectionLost, StateMachineError) as exc:
+            self._record_error(report, exc)
+            connection.close()
+            return None
+        return connection
+
+    def _cycle_to_sut(self, connection: DownstreamConnection, deadline: float) -> None:
+        """Move one board to the upstream port of the system under test.
+           MachineReady may arrive before or after BoardAvailable.
+        """
+        board_id = str(uuid.uuid4())
+        connection.send_msg(Message.BoardAvailable(board_id, self.machine_id))
+        self._expect(connection, Tag.MACHINE_READY, deadline)
+        start_transport = self._expect(connection, Tag.START_TRANSPORT, deadline)
+        self._check_board_id(start_transport, board_id)
+        connection.send_msg(Message.TransportFinished(TransferState.COMPLETE, board_id))
+        stop_transport = self._expect(connection, Tag.STOP_TRANSPORT, deadline)
+        self._check_board_id(stop_transport, board_id)
+
+    def _cycle_from_sut(self, connection: UpstreamConnection, deadline: float) -> None:
+        """Take one board from the downstream port of the system under test."""
+        connection.send_msg(self._frames.get(Message.MachineReady))
+        board_available = self._expect(connection, Tag.BOARD_AVAILABLE, deadline)
+        board_id = board_available.data.get('BoardId')
+        connection.send_msg(Message.StartTransport(board_id))
+        transport_finished = self._expect(connection, Tag.TRANSPORT_FINISHED, deadline)
+        self._check_board_id(transport_finished, board_id)
+        connection.send_msg(Message.StopTransport(TransferState.COMPLETE, board_id))
+
+    def _expect(self, connection, tag: str, deadline: float) -> Message:
+        """Wait for a message of the system under test, see _wait."""
+        return self._wait(deadline, self.receive_timeout, connection.expect_message, tag)
+
+    @staticmethod
+    def _wait(deadline: float, timeout_secs: float, wait, *args):
+        """Call wait(*args, timeout_secs=...) with the timeout cut to the end of the run.
+           Raises _RunEnded instead of ConnectionLost if the shortened wait timed out.
+        """
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise _RunEnded()
+        try:
+            return wait(*args, timeout_secs=min(timeout_secs, remaining))
+        except ConnectionLost as exc:
+            # a lost connection is chained to the listener exception, a timeout is not
+            if remaining < timeout_secs and exc.__cause__ is None and time.monotonic() >= deadline:
+                raise _RunEnded() from exc
+            raise
+
+    @staticmethod
+    def _check_board_id(msg: Message, board_id: str) -> None:
+        """Raise CycleError if the message refers to another board."""
+        if msg.data.get('BoardId') != board_id:
+            raise CycleError(f"{msg.tag} with BoardId {msg.data.get('BoardId')}, expected {board_id}")
+
+    def _record_error(self, report: LoadReport, exc: Exception) -> None:
+        """Add a protocol error to the report."""
+        error = f"{type(exc).__name__}: {exc}"
+        self._log.warning('Load cycle %s failed, %s', report.cycles + 1, error)
+        report.errors.append(error)
@@ -0,0 +1,122 @@
+"""Logging to file on a background thread.
+
+Handlers writing to a file block the logging thread, e.g. the receiving
+thread of a connection, until the record is written. A LogQueue puts the
+records in a bounded queue instead. A listener thread formats and writes
+them, and flushes the file after a batch of records or when the queue
+runs empty:
+
+    log_queue = LogQueue(file_handler)
+    logging.getLogger('ipc_hermes').addHandler(log_queue.handler)
+    ...
+    log_queue.stop()
+
+The message text is merged with its arguments before the record is queued,
+as arguments such as a received message may change or be built lazily once
+the logging thread continues. The listener applies the formatters and
+formats exceptions. When the queue is full, records are dropped and
+counted instead of blocking the logging thread.
+"""
+import copy
+import queue
+import logging
+import logging.handlers
+
+QUEUE_SIZE = 10000  # records
+BATCH_SIZE = 100  # records written between flushes
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records with their message text and drops them when the queue is full."""
+    def __init__(self, record_queue: queue.Queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Copy of the record with the arguments merged into the message.
+           Unlike QueueHandler.prepare, formatting is left to the listener.
+        """
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchFileHandler(logging.FileHandler):
+    """FileHandler flushing every batch_size records instead of after each record."""
+    def __init__(self, filename: str, mode: str = 'a', encoding: str = None,
+                 batch_size: int = BATCH_SIZE):
+        super().__init__(filename, mode, encoding)
+        self.batch_size = batch_size
+        self._unflushed = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            self._unflushed += 1
+            if self._unflushed >= self.batch_size:
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.handleError(record)
+
+    def flush(self) -> None:
+        super().flush()
+        self._unflushed = 0
+
+
+class _FlushingListener(logging.handlers.QueueListener):
+    """Flushes the handlers before waiting on an empty queue."""
+    def dequeue(self, block: bool) -> logging.LogRecord:
+        try:
+            return self.queue.get_nowait()
+        except queue.Empty:
+            for handler in self.handlers:
+                handler.flush()
+            return self.queue.get(block)
+
+    def enqueue_sentinel(self) -> None:
+        """Waits for room in a full queue, the records before the sentinel are still written."""
+        self.queue.put(self._sentinel)
+
+
+class LogQueue:
+    """Bounded queue of log records written by the given handlers on a listener thread.
+
+    Args:
+        handlers (logging.Handler): Handlers writing the records, e.g. a BatchFileHandler.
+        maxsize (int): Records queued before further records are dropped.
+    """
+    def __init__(self, *handlers: logging.Handler, maxsize: int = QUEUE_SIZE):
+        self._handlers = handlers
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize))
+        self._listener = _FlushingListener(self.handler.queue, *handlers, respect_handler_level=True)
+        self._listener.start()
+        self._running = True
+
+    @property
+    def dropped(self) -> int:
+        """Number of records dropped because the queue was full."""
+        return self.handler.dropped
+
+    def stop(self) -> None:
+        """Write the queued records, report dropped records and close the handlers."""
+        if not self._running:
+            return
+        self._running = False
+        self._listener.stop()
+        if self.dropped:
+            record = logging.makeLogRecord({'name': __name__, 'levelno': logging.WARNING,
+                                            'levelname': 'WARNING',
+                                            'msg': f"{self.dropped} log records dropped, queue full"})
+            for handler in self._handlers:
+                handler.handle(record)
+        for handler in self._handlers:
+            handler.close()
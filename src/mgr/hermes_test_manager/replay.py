@@ -0,0 +1,189 @@
+"""Replay one side of a captured session against a system under test.
+
+The messages this code sent in the captured session are sent again and
+each message the system under test sends is compared with the captured
+one as it arrives. The gaps between messages are kept, scaled by a speed
+factor, or skipped for replay as fast as possible:
+
+    replayer = Replayer('session.hcap', speed=10.0)
+    report = replayer.run(host, port)
+    print(report)
+
+Timestamps are not compared. Board ids generated by the system under test
+differ between sessions, so the first value received for a captured
+BoardId or ForecastId is taken as its replacement, in the comparison of
+later messages as well as in the messages sent.
+"""
+import time
+import logging
+import xml.etree.ElementTree as ET
+from enum import Enum
+from enum import unique
+
+from ipc_hermes.capture import CaptureReader, Direction
+from ipc_hermes.connections import UpstreamConnection, DownstreamConnection, ConnectionLost
+from ipc_hermes.connections import RECEIVE_TIMEOUT, SOCKET_TIMEOUT
+from ipc_hermes.messages import Message
+from ipc_hermes.state_machine import StateMachineError
+
+ID_ATTRIBUTES = ('BoardId', 'ForecastId')
+IGNORED_ATTRIBUTES = ('Timestamp',)
+
+
+@unique
+class ReplaySide(Enum):
+    """Captured side of the session."""
+    UPSTREAM = 0    # UpstreamConnection, connects to the system under test
+    DOWNSTREAM = 1  # DownstreamConnection, the system under test connects to it
+
+
+class ReplayReport:
+    """Result of a replay."""
+    def __init__(self, filename: str, side: ReplaySide):
+        self.filename = filename
+        self.side = side
+        self.duration_secs = 0.0
+        self.sent = 0
+        self.received = 0
+        self.unexpected = 0
+        self.mismatches = []
+        self.errors = []
+
+    @property
+    def passed(self) -> bool:
+        """True if all captured messages were received without differences."""
+        return not self.mismatches and not self.errors
+
+    def __str__(self):
+        lines = [f"Replay of {self.filename} ({self.side.name})",
+                 f"Duration: {self.duration_secs:.1f} s",
+                 f"Sent: {self.sent}, received: {self.received}, not in capture: {self.unexpected}",
+                 f"Mismatches: {len(self.mismatches)}"]
+        lines.extend(f"  {mismatch}" for mismatch in self.mismatches)
+        lines.extend(f"Error: {error}" for error in self.errors)
+        return "\n".join(lines)
+
+
+class Replayer:
+    """Replays the messages of one captured connection.
+
+    Args:
+        filename (str): Capture file written by ipc_hermes.capture.CaptureWriter.
+        connection_id (int): Connection to replay, default the first one in the capture.
+        side (ReplaySide): Default None derives it from the first message,
+            the connecting side sends the first ServiceDescription.
+        speed (float): Gaps between messages are divided by speed, None replays as fast as possible.
+        receive_timeout (float): Seconds to wait for each captured message of the system under test.
+        ignore (tuple): Attributes not compared.
+    """
+    def __init__(self, filename: str, connection_id: int = None, side: ReplaySide = None,
+                 speed: float = 1.0, receive_timeout: float = RECEIVE_TIMEOUT,
+                 ignore: tuple = IGNORED_ATTRIBUTES):
+        self.filename = filename
+        self.speed = speed
+        self.receive_timeout = receive_timeout
+        self.ignore = ignore
+        self._ids = {}
+        self._log = logging.getLogger('hermes_test_api')
+        with CaptureReader(filename) as reader:
+            if connection_id is None:
+                ids = reader.connection_ids()
+                if not ids:
+                    raise ValueError(f"Empty capture: {filename}")
+                connection_id = ids[0]
+            self.connection_id = connection_id
+            if side is None:
+                first = next(reader.messages(connection_id), None)
+                if first is None:
+                    raise ValueError(f"No messages of connection {connection_id} in {filename}")
+                side = ReplaySide.UPSTREAM if first.direction is Direction.SEND else ReplaySide.DOWNSTREAM
+            self.side = side
+
+    def run(self, host: str, port: str|int) -> ReplayReport:
+        """Replay against the system under test. For the DOWNSTREAM side host and port
+           are the address to listen on.
+        """
+        report = ReplayReport(self.filename, self.side)
+        self._ids.clear()
+        start = time.monotonic()
+        connection = None
+        self._log.info('Start replay of connection %s in %s', self.connection_id, self.filename)
+        try:
+            connection = self._connect(host, port)
+            with CaptureReader(self.filename) as reader:
+                self._replay(reader, connection, report)
+            report.unexpected = len(connection.mailbox)
+        except (OSError, ConnectionLost, StateMachineError) as exc:
+            self._log.warning('Replay stopped, %s', exc)
+            report.errors.append(f"{type(exc).__name__}: {exc}")
+        finally:
+            if connection is not None:
+                connection.close()
+            report.duration_secs = time.monotonic() - start
+        self._log.info('Replay done, %s sent, %s received, %s mismatches',
+                       report.sent, report.received, len(report.mismatches))
+        return report
+
+    def _connect(self, host: str, port: str|int):
+        """Open the connection of the captured side."""
+        if self.side is ReplaySide.UPSTREAM:
+            connection = UpstreamConnection()
+            connection.strict_send_protocol = False
+            connection.connect(host, port)
+            connection.start_receiving()
+        else:
+            connection = DownstreamConnection()
+            connection.strict_send_protocol = False
+            connection.connect(host, port)
+            connection.wait_for_connection(SOCKET_TIMEOUT)
+        return connection
+
+    def _replay(self, reader: CaptureReader, connection, report: ReplayReport) -> None:
+        """Send and expect the captured messages in captured order."""
+        previous_ns = None
+        previous_done = time.monotonic()
+        for record in reader.messages(self.connection_id):
+            delay = 0.0
+            if previous_ns is not None and self.speed:
+                delay = (record.timestamp_ns - previous_ns) / 1e9 / self.speed
+            previous_ns = record.timestamp_ns
+            captured = Message(ET.fromstring(record.data))
+            if record.direction is Direction.SEND:
+                remaining = previous_done + delay - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+                connection.send_tag_and_bytes(captured.tag, self._replace_ids(record.data))
+                report.sent += 1
+            else:
+                received = connection.expect_message(captured.tag, self.receive_timeout)
+                report.received += 1
+                for mismatch in self._diff(captured.xml_root, received.xml_root, ''):
+                    self._log.warning('Replay mismatch in message %s: %s', report.received, mismatch)
+                    report.mismatches.append(f"{captured.tag} #{report.received}: {mismatch}")
+            previous_done = time.monotonic()
+
+    def _replace_ids(self, data: bytes) -> bytes:
+        """Use the ids of the system under test in a message to be sent."""
+        for captured, current in self._ids.items():
+            data = data.replace(captured.encode(), current.encode())
+        return data
+
+    def _diff(self, captured: ET.Element, received: ET.Element, path: str) -> list:
+        """Differences of a received element and its descendants from the captured ones."""
+        if captured.tag != received.tag:
+            return [f"{path}: <{received.tag}>, captured <{captured.tag}>"]
+        path = f"{path}/{captured.tag}"
+        mismatches = []
+        for name in sorted(set(captured.attrib) | set(received.attrib)):
+            if name in self.ignore:
+                continue
+            expected, new = captured.get(name), received.get(name)
+            if name in ID_ATTRIBUTES and expected is not None and new is not None:
+                expected = self._ids.setdefault(expected, new)
+            if expected != new:
+                mismatches.append(f"{path}@{name}: {new!r}, expected {expected!r}")
+        if len(captured) != len(received):
+            mismatches.append(f"{path}: {len(received)} child elements, captured {len(captured)}")
+        for captured_child, received_child in zip(captured, received):
+            mismatches.extend(self._diff(captured_child, received_child, path))
+        return mismatches
@@ -9,7 +9,11 @@ import pytest
 
 from callback_tags import CbEvt
 from ipc_hermes.connections import UpstreamConnection, DownstreamConnection
-from ipc_hermes.messages import Message, Tag
+from ipc_hermes.reactor import shared_reactor
+from ipc_hermes.latency import LatencyRecorder
+from ipc_hermes.capture import CaptureWriter
+from ipc_hermes.messages import Message, Tag, LogFormat
+from ipc_hermes.serializer import FrameCache, CachedFrame
 
 _ALL_TEST_CASES = {}
 
@@ -62,6 +66,11 @@ class EnvironmentManager():
     _callback_used = False
     _use_handshake_callback = False
     _use_wrapper_callback = False
+    _use_shared_reactor = False
+    _latency_recorder = LatencyRecorder()
+    _capture = None
+    _frame_cache = FrameCache()
+    _log_format = LogFormat.SUMMARY
     _machine_id = "Hermes Test API"
     _lane_id = "1"
     _system_under_test_host = '127.0.0.1'
@@ -139,6 +148,44 @@ class EnvironmentManager():
     def use_wrapper_callback(self, enabled:bool):
         self._use_wrapper_callback = enabled
 
+    @property
+    def use_shared_reactor(self) -> bool:
+        """Let all connections share one receiving thread
+           instead of starting a thread per connection
+        """
+        return self._use_shared_reactor
+
+    @use_shared_reactor.setter
+    def use_shared_reactor(self, enabled:bool):
+        self._use_shared_reactor = enabled
+
+    def connection_reactor(self):
+        """Reactor to pass to new connections, None for a thread per connection"""
+        return shared_reactor() if self._use_shared_reactor else None
+
+    @property
+    def latency_recorder(self) -> LatencyRecorder:
+        """Response latency of the system under test, recorded by all connections (read-only)"""
+        return self._latency_recorder
+
+    @property
+    def capture(self) -> CaptureWriter:
+        """Wire capture of all connections, None if disabled"""
+        return self._capture
+
+    @capture.setter
+    def capture(self, writer:CaptureWriter):
+        self._capture = writer
+
+    @property
+    def log_format(self) -> LogFormat:
+        """Format of sent and received messages in the log of all connections"""
+        return self._log_format
+
+    @log_format.setter
+    def log_format(self, value:LogFormat):
+        self._log_format = value
+
     @property
     def lane_id(self) -> str:
         """Lane ID used in tests"""
@@ -147,12 +194,23 @@ class EnvironmentManager():
     @lane_id.setter
     def lane_id(self, value:str):
         self._lane_id = value
+        self._frame_cache.clear()
 
     @property
     def machine_id(self) -> str:
         """Machine ID used in tests"""
         return self._machine_id
 
+    @machine_id.setter
+    def machine_id(self, value:str):
+        self._machine_id = value
+        self._frame_cache.clear()
+
+    @property
+    def frame_cache(self) -> FrameCache:
+        """Serialized messages for repeated sends, cleared when lane_id or machine_id changes (read-only)"""
+        return self._frame_cache
+
     @property
     def system_under_test_host(self) -> str:
         """Host address of the system under test"""
@@ -184,6 +242,10 @@ class EnvironmentManager():
         """Return ServiceDescription message"""
         return Message.ServiceDescription(self.machine_id, self.lane_id)
 
+    def service_description_frame(self) -> CachedFrame:
+        """Return ServiceDescription message to send, serialized once per machine_id and lane_id"""
+        return self._frame_cache.get(Message.ServiceDescription, self.machine_id, self.lane_id)
+
     def optional_start_of_test_callback(self) -> None:
         """Send optional callback before test is executed
            otherwise just reset callback_used flag
@@ -211,15 +273,18 @@ def create_upstream_context(receive: bool=True, handshake: bool=False):
             receive (bool) default True, start receiving messages.
             handshake (bool) default False, exchange ServiceDescriptions
     """
-    connection = UpstreamConnection()
-    connection.strict_send_protocol = False
     env = EnvironmentManager()
+    connection = UpstreamConnection(env.connection_reactor())
+    connection.strict_send_protocol = False
+    connection.latency = env.latency_recorder
+    connection.capture = env.capture
+    connection.log_format = env.log_format
     try:
         connection.connect(env.system_under_test_host, env.system_under_test_port)
         if receive:
             connection.start_receiving()
         if handshake:
-            connection.send_msg(EnvironmentManager().service_description_message())
+            connection.send_msg(EnvironmentManager().service_description_frame())
             env.run_callback(CbEvt.WAIT_FOR_MSG, tag=Tag.SERVICE_DESCRIPTION)
             connection.expect_message(Tag.SERVICE_DESCRIPTION)
         env.log.debug('Yield connection to test case')
@@ -236,9 +301,12 @@ def create_downstream_context(handshake: bool=False):
        Args:
             handshake (bool) default False, exchange ServiceDescriptions
     """
-    connection = DownstreamConnection()
-    connection.strict_send_protocol = False
     env = EnvironmentManager()
+    connection = DownstreamConnection(env.connection_reactor())
+    connection.strict_send_protocol = False
+    connection.latency = env.latency_recorder
+    connection.capture = env.capture
+    connection.log_format = env.log_format
     try:
         connection.connect('localhost', int(env.test_manager_port))
         client_address = connection.wait_for_connection(10)
@@ -246,7 +314,7 @@ def create_downstream_context(handshake: bool=False):
         if handshake:
             env.run_callback(CbEvt.WAIT_FOR_MSG, tag=Tag.SERVICE_DESCRIPTION)
             connection.expect_message(Tag.SERVICE_DESCRIPTION)
-            connection.send_msg(EnvironmentManager().service_description_message())
+            connection.send_msg(EnvironmentManager().service_description_frame())
         env.log.debug('Yield connection to test case')
         yield connection
         env.log.debug('Return from yield')
@@ -19,6 +19,9 @@ from ipc_hermes.messages import MAX_MESSAGE_SIZE
 from ipc_hermes.messages import Message, Tag, TransferState, NotificationCode, SeverityType
 from ipc_hermes.connections import ConnectionLost
 
+# time allowed for the system under test to close the connection after a protocol error
+CLOSE_TIMEOUT = 1.0
+
 @hermes_testcase
 def test_connect_disconnect_n_times():
     """
@@ -175,6 +178,7 @@ def test_terminate_on_wrong_message_in_not_available_not_ready():
                                                     SeverityType.FATAL)
 
             # other end has to close connection so check if socked is dead now
+            ctxt.wait_for_disconnect(CLOSE_TIMEOUT)
             try:
                 ctxt.send_msg(Message.Notification(NotificationCode.MACHINE_SHUTDOWN,
                                                    SeverityType.INFORMATION,
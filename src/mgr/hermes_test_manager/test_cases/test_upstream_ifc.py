@@ -17,13 +17,14 @@ from test_cases import EnvironmentManager, message_validator
 from ipc_hermes.messages import Tag, Message, TransferState, NotificationCode, SeverityType
 from ipc_hermes.connections import ConnectionLost
 
+# time allowed for the system under test to close the connection after a protocol error
+CLOSE_TIMEOUT = 1.0
+
 
 @hermes_testcase
 def test_start_shutdown_n_times():
     """
     Test start and shutdown server 10 times. Ignore any ServiceDescription received.
-
-    Warning: this test may take a minute to complete.
     """
     for _ in range(10):
         with create_downstream_context():
@@ -34,8 +35,6 @@ def test_start_shutdown_n_times():
 def test_exchange_service_description_shutdown_n_times():
     """
     Test connect and disconnect n times. Exchange ServiceDescription and shutdown server.
-
-    Warning: this test may take a minute to complete.
     """
     for _ in range(10):
         with create_downstream_context() as ctxt:
@@ -86,6 +85,7 @@ def test_terminate_on_wrong_message_in_not_available_not_ready2():
                                                     SeverityType.FATAL)
 
             # other end has to close connection so check if socked is dead now
+            ctxt.wait_for_disconnect(CLOSE_TIMEOUT)
             try:
                 ctxt.send_msg(Message.Notification(NotificationCode.MACHINE_SHUTDOWN,
                                                    SeverityType.INFORMATION,
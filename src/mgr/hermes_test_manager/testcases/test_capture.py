@@ -0,0 +1,24 @@
+"""Tests of the capture file."""
+
+from ipc_hermes.capture import CaptureReader, CaptureWriter, Direction
+from ipc_hermes.messages import Message
+
+
+def test_message_index(tmp_path):
+    msg_bytes = Message.BoardAvailable('00000000-0000-0000-0000-000000000000', 'Test').to_bytes()
+    other = Message.CheckAlive().to_bytes()
+    path = str(tmp_path / 'test.hcap')
+    with CaptureWriter(path) as writer:
+        # two messages in one record, a message split over records of two connections
+        writer.record(1, Direction.RECV, msg_bytes + msg_bytes[:10])
+        writer.record(2, Direction.SEND, other[:5])
+        writer.record(1, Direction.SEND, other)
+        writer.record(2, Direction.SEND, other[5:] + other)
+        writer.record(1, Direction.RECV, msg_bytes[10:20])
+        writer.record(1, Direction.RECV, msg_bytes[20:] + msg_bytes[:3])
+    with CaptureReader(path) as reader:
+        messages = list(reader.messages())
+        assert reader.message_count() == len(messages) == 5
+        assert [reader.message(index) for index in range(5)] == messages
+        assert reader.message(4).data == msg_bytes
+        assert reader.message(4).timestamp_ns == reader[5].timestamp_ns
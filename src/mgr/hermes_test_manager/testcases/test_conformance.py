@@ -0,0 +1,24 @@
+"""Tests of the offline conformance check."""
+
+import pytest
+
+from ipc_hermes import conformance
+from ipc_hermes.capture import CaptureWriter, Direction
+from ipc_hermes.messages import Message
+
+pytest.importorskip('numpy')
+
+
+def test_xml_declaration_and_unparsed_tag(tmp_path):
+    service_description = Message.ServiceDescription('Test', 1).to_bytes()
+    path = str(tmp_path / 'test.hcap')
+    with CaptureWriter(path) as writer:
+        writer.record(1, Direction.SEND, b'<?xml version="1.0" encoding="utf-8"?>\n' + service_description)
+        writer.record(1, Direction.RECV, service_description)
+        writer.record(1, Direction.SEND, b'<Hermes><!-- no message --></Hermes>')
+    findings = []
+    traces = conformance.load_capture(path, unchecked=findings)
+    assert findings == [conformance.Unparsed(1, 2, b'<Hermes><!-- no message --></Hermes>')]
+    assert len(traces) == 1
+    assert list(traces[0].from_client) == [True, False, True]
+    assert not conformance.check(traces[0])
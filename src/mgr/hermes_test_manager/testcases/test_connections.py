@@ -0,0 +1,26 @@
+"""Tests of the threaded connections."""
+
+import socket
+import time
+
+import pytest
+
+from ipc_hermes.connections import ConnectionLost, UpstreamConnection
+from ipc_hermes.messages import Tag
+
+
+def test_expect_message_after_disconnect():
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        connection = UpstreamConnection()
+        connection.connect('127.0.0.1', server.getsockname()[1])
+        connection.start_receiving()
+        peer, _ = server.accept()
+        peer.close()
+        try:
+            start = time.monotonic()
+            with pytest.raises(ConnectionLost) as info:
+                connection.expect_message(Tag.SERVICE_DESCRIPTION, timeout_secs=10)
+            assert time.monotonic() - start < 5
+            assert info.value.__cause__ is not None
+        finally:
+            connection.close()
@@ -0,0 +1,68 @@
+"""Tests of splitting the received byte stream into messages."""
+
+import pytest
+
+from ipc_hermes.framing import MessageFramer, StreamingParser, ENDTAG
+from ipc_hermes.messages import Message
+
+
+class _PacketSource:
+    """Socket stand-in returning a prepared list of packets."""
+    def __init__(self, packets):
+        self._packets = list(packets)
+
+    def recv_into(self, buffer):
+        """Copy the next packet into the buffer, like socket.recv_into."""
+        packet = self._packets.pop(0)
+        buffer[:len(packet)] = packet
+        return len(packet)
+
+
+@pytest.fixture(name='msg_bytes')
+def fixture_msg_bytes():
+    return Message.BoardAvailable('00000000-0000-0000-0000-000000000000', 'Test').to_bytes()
+
+
+def _parse(packets) -> list:
+    parser = StreamingParser()
+    sock = _PacketSource(packets)
+    roots = []
+    for _ in packets:
+        parser.receive(sock)
+        roots.extend(parser.roots())
+    return roots
+
+
+def _frames(packets) -> list:
+    framer = MessageFramer()
+    sock = _PacketSource(packets)
+    frames = []
+    for _ in packets:
+        framer.receive(sock)
+        for frame in framer.frames():
+            frames.append(bytes(frame))
+            frame.release()
+    return frames
+
+
+@pytest.mark.parametrize('size', [1, 2, 7, 64])
+def test_split_packets(msg_bytes, size):
+    stream = 3 * msg_bytes
+    packets = [stream[i:i + size] for i in range(0, len(stream), size)]
+    assert _frames(packets) == 3 * [msg_bytes]
+    assert len(_parse(packets)) == 3
+
+
+def test_split_end_tag_with_stale_buffer(msg_bytes):
+    # the receive buffer still holds b'es>' from the previous packet
+    # behind the one byte received, it must not complete the end tag
+    packets = [msg_bytes[:-3], b'es>' + msg_bytes[:-3], b'e', b's>', msg_bytes]
+    assert len(_parse(packets)) == 3
+    assert _frames(packets) == 3 * [msg_bytes]
+
+
+def test_find_end_limited_to_received_bytes():
+    parser = StreamingParser()
+    parser._carry = ENDTAG[:-3]
+    assert parser._find_end(bytearray(b'es>zzzz'), 0, 1) == -1
+    assert parser._find_end(bytearray(b'es>zzzz'), 0, 3) == 3
@@ -0,0 +1,27 @@
+"""Tests of pairing sent requests with received replies."""
+
+from ipc_hermes.latency import LatencyRecorder
+from ipc_hermes.messages import Message, Tag
+
+BOARD_ID = '00000000-0000-0000-0000-000000000000'
+
+
+def test_reply_after_request():
+    recorder = LatencyRecorder()
+    tracker = recorder.tracker()
+    tracker.sent(Tag.BOARD_AVAILABLE, Message.BoardAvailable(BOARD_ID, 'Test'), 1000)
+    tracker.received(Tag.MACHINE_READY, Message.MachineReady(), 3000)
+    histogram = recorder.histogram(Tag.BOARD_AVAILABLE, Tag.MACHINE_READY)
+    assert histogram.count == 1
+    assert histogram.min_ns == 2000
+
+
+def test_reply_before_request():
+    # MachineReady received before BoardAvailable is sent, in each cycle
+    recorder = LatencyRecorder()
+    tracker = recorder.tracker()
+    for cycle in range(3):
+        time_ns = cycle * 1000000
+        tracker.received(Tag.MACHINE_READY, Message.MachineReady(), time_ns)
+        tracker.sent(Tag.BOARD_AVAILABLE, Message.BoardAvailable(BOARD_ID, 'Test'), time_ns + 1000)
+    assert recorder.histogram(Tag.BOARD_AVAILABLE, Tag.MACHINE_READY).count == 0
@@ -0,0 +1,31 @@
+"""Tests of logging on a background thread."""
+
+import logging
+
+from log_queue import LogQueue
+
+
+class _Collector(logging.Handler):
+    """Handler keeping the formatted records."""
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def test_arguments_formatted_when_queued():
+    collector = _Collector()
+    log_queue = LogQueue(collector)
+    log = logging.getLogger('test_log_queue')
+    log.propagate = False
+    log.addHandler(log_queue.handler)
+    try:
+        attributes = {'BoardId': 'original'}
+        log.warning('Sent: %s', attributes)
+        attributes['BoardId'] = 'MUTATED'
+    finally:
+        log.removeHandler(log_queue.handler)
+        log_queue.stop()
+    assert collector.lines == ["Sent: {'BoardId': 'original'}"]
@@ -0,0 +1,33 @@
+"""Tests of sending serialized messages."""
+
+import socket
+
+from ipc_hermes.connections import UpstreamConnection
+from ipc_hermes.latency import LatencyRecorder
+from ipc_hermes.messages import Message, TransferState
+from ipc_hermes.serializer import FrameCache
+
+BOARD_ID = '00000000-0000-0000-0000-000000000000'
+
+
+def test_cached_frame_get():
+    frame = FrameCache().get(Message.TransportFinished, TransferState.COMPLETE, BOARD_ID)
+    assert frame.get('BoardId') == BOARD_ID
+    assert frame.get('Missing', 'default') == 'default'
+
+
+def test_send_cached_frame_with_latency():
+    frame = FrameCache().get(Message.TransportFinished, TransferState.COMPLETE, BOARD_ID)
+    with socket.create_server(('127.0.0.1', 0)) as server:
+        connection = UpstreamConnection()
+        connection.connect('127.0.0.1', server.getsockname()[1])
+        peer, _ = server.accept()
+        try:
+            connection.strict_send_protocol = False
+            connection.latency = LatencyRecorder()
+            msg_bytes = frame.to_bytes()
+            assert connection.send_msg(frame) == len(msg_bytes)
+            assert peer.recv(len(msg_bytes), socket.MSG_WAITALL).endswith(b'</Hermes>')
+        finally:
+            peer.close()
+            connection.close()